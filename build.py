@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""Build pomo into a single-file zipapp.
+
+The zipapp holds precompiled bytecode for pomo and its vendored modules
+(docopt, playsound), along with the bundled sounds, the README and the
+licenses, so that it runs without the source tree. The sources are
+included too: the bytecode only suits the Python version that built it,
+and any other version loads the sources instead.
+
+Building needs Python 3.11 or newer.
+
+Usage:
+    build.py [--output=<path>]
+    build.py --bench [--output=<path>] [--runs=<n>]
+    build.py --help
+
+Options:
+    -h --help           Show this screen.
+    --output=<path>     Where to write the zipapp [default: dist/pomo.pyz].
+    --bench             Build, then compare the cold-start time of the
+                        zipapp with that of pomo.py.
+    --runs=<n>          Number of runs to time for each [default: 20].
+"""
+
+import glob
+import os
+import py_compile
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+from internal.docopt import docopt
+
+_ROOT = os.path.dirname(os.path.realpath(__file__))
+_MODULES = ['pomo.py'] + sorted(glob.glob('internal/*.py', root_dir=_ROOT))
+_DATA = ['README.md', 'LICENSE', 'internal/pomodoro.wav', 'internal/break.wav',
+         'internal/licenses/docopt', 'internal/licenses/playsound']
+_MAIN = """import sys
+if sys.argv[1:] == ['prompt']:
+    from internal.status import print_prompt
+    sys.exit(print_prompt())
+import pomo
+pomo.main()
+"""
+
+
+def _add_module(archive, source, arcname, workdir):
+    # zipimport only loads bytecode that sits next to the source (not in
+    # __pycache__), so each module is stored as a .pyc beside its .py.
+    # Hash-based pycs don't depend on file timestamps. A .pyc with another
+    # version's magic number is skipped, and the .py is compiled instead.
+    archive.write(source, arcname)
+    cfile = os.path.join(workdir, 'module.pyc')
+    py_compile.compile(
+        source, cfile=cfile, dfile=arcname, doraise=True,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+    archive.write(cfile, arcname[:-len('.py')] + '.pyc')
+
+
+def build(output):
+    output = os.path.abspath(output)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with tempfile.TemporaryDirectory() as workdir, \
+            open(output, 'wb') as output_file:
+        output_file.write(b'#!/usr/bin/env python3\n')
+        with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as archive:
+            # internal/ is a namespace package, which zipimport only finds
+            # through an explicit directory entry.
+            archive.mkdir('internal')
+            main_path = os.path.join(workdir, '__main__.py')
+            with open(main_path, 'w') as main_file:
+                main_file.write(_MAIN)
+            _add_module(archive, main_path, '__main__.py', workdir)
+            for module in _MODULES:
+                _add_module(archive, os.path.join(_ROOT, module), module,
+                            workdir)
+            for data in _DATA:
+                archive.write(os.path.join(_ROOT, data), data)
+    os.chmod(output, 0o755)
+    return output
+
+
+def _cold_start(command, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def bench(zipapp, runs):
+    script = _cold_start(
+            [sys.executable, os.path.join(_ROOT, 'pomo.py'), '--version'], runs)
+    bundled = _cold_start([sys.executable, zipapp, '--version'], runs)
+    print(f'pomo.py:  {script*1000:7.1f} ms (median of {runs})')
+    print(f'zipapp:   {bundled*1000:7.1f} ms (median of {runs})')
+
+
+if __name__ == '__main__':
+    args = docopt(__doc__)
+    output = build(os.path.join(_ROOT, args['--output']))
+    print(f'Built {output}')
+    if args['--bench']:
+        bench(output, int(args['--runs']))
@@ -1,11 +1,25 @@
 #!/bin/bash
 
 DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" >/dev/null 2>&1 && pwd )"
-echo -e "This script will add a symlink from"
-echo -e "$HOME/bin/pomo"
-echo -e "to"
-echo -e "$DIR/pomo.py"
-echo -e "so that you can call pomo from any directory."
+
+# With --zipapp, pomo is built into a single self-contained file, which is
+# copied to ~/bin/pomo instead of linking to the source tree.
+ZIPAPP=0
+if [[ "$1" = "--zipapp" ]]; then
+    ZIPAPP=1
+fi
+
+if [[ $ZIPAPP -eq 1 ]]; then
+    echo -e "This script will build pomo into a single file and copy it to"
+    echo -e "$HOME/bin/pomo"
+    echo -e "so that you can call pomo from any directory."
+else
+    echo -e "This script will add a symlink from"
+    echo -e "$HOME/bin/pomo"
+    echo -e "to"
+    echo -e "$DIR/pomo.py"
+    echo -e "so that you can call pomo from any directory."
+fi
 read -p $'\033[33mIs this ok [N/y]?\033[0m ' -r
 if [[ ! $REPLY =~ ^[Yy]$ ]]
 then
@@ -24,7 +38,25 @@ if [ ! -d $HOME/bin ]; then
     echo -e "\033[32mCreated $HOME/bin\033[0m"
 fi
 
-if ln -s "$DIR/pomo.py" "$HOME/bin/pomo"
+if [[ $ZIPAPP -eq 1 ]]; then
+    # The zipapp keeps its configuration in the user's data directory;
+    # carry over an existing configuration.
+    DATA_DIR="${XDG_DATA_HOME:-$HOME/.local/share}/pomo"
+    if [ -f "$DIR/internal/data.json" ] && [ ! -f "$DATA_DIR/data.json" ]; then
+        mkdir -p "$DATA_DIR"
+        cp "$DIR/internal/data.json" "$DATA_DIR/data.json"
+    fi
+    # build.py uses ZipFile.mkdir and glob(root_dir=), from Python 3.11
+    if ! python3 -c 'import sys; sys.exit(sys.version_info < (3, 11))'; then
+        echo -e "\033[91mBuilding pomo into a single file needs Python 3.11 or newer.\033[0m"
+        [[ "$0" = "$BASH_SOURCE" ]] && exit 1 || return 1
+    fi
+    python3 "$DIR/build.py" --output="$DIR/dist/pomo.pyz" \
+        && cp "$DIR/dist/pomo.pyz" "$HOME/bin/pomo"
+else
+    ln -s "$DIR/pomo.py" "$HOME/bin/pomo"
+fi
+if [ $? -eq 0 ]
 then
     echo -e "\033[32mDone.\033[0m"
     echo -e "Call \`pomo --help\` for more info."
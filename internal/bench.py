@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""Throughput benchmarks for pomo's history processing.
+
+Generates a synthetic history in a temporary directory, then times how
+many records per second are processed.
+
+Usage:
+    bench.py report [--people=<n>] [--records=<n>]
+    bench.py export [--records=<n>]
+    bench.py --help
+
+Options:
+    -h --help           Show this screen.
+    --people=<n>        Number of people whose histories are merged
+                        [default: 50].
+    --records=<n>       Number of records, in total [default: 1000000].
+
+Run it from the repository root with `python3 -m internal.bench`.
+"""
+
+import os
+import resource
+import tempfile
+import time
+
+from internal import export, history, report
+from internal.docopt import docopt
+from internal.ledger import WORK, SHORT_BREAK
+
+# A pomodoro and its short break, every half hour
+_STEP = 30*60
+
+
+def generate(directory, records, start=1.6e9, host='bench'):
+    """Write `records` synthetic records to the history in `directory`."""
+    batch = []
+    for index in range(records):
+        kind = WORK if index % 2 == 0 else SHORT_BREAK
+        elapsed = 1500. if kind == WORK else 300.
+        moment = start + (index // 2)*_STEP + (0 if kind == WORK else 1500)
+        batch.append({'kind': kind, 'start': moment, 'end': moment + elapsed,
+                      'planned': elapsed, 'elapsed': elapsed, 'paused': 0.,
+                      'overrun': 0., 'status': 'completed', 'tasks': [],
+                      'host': host, 'id': f'{host}-{index}'})
+        if len(batch) == 10000:
+            history.append(batch, directory)
+            batch = []
+    history.append(batch, directory)
+
+
+def _report(people, records):
+    with tempfile.TemporaryDirectory() as workdir:
+        directories = [os.path.join(workdir, f'person{index}')
+                       for index in range(people)]
+        for index, directory in enumerate(directories):
+            generate(directory, records // people, start=1.6e9 + index*60,
+                     host=f'person{index}')
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as output:
+            report.write_csv(report.weekly_rows(
+                report.merged_records(directories)), output)
+        elapsed = time.perf_counter() - start
+    total = (records // people)*people
+    print(f'report: merged {total} records from {people} people in '
+          f'{elapsed:.2f} s ({total/elapsed:,.0f} records/s)')
+
+
+def _export(records):
+    with tempfile.TemporaryDirectory() as workdir:
+        generate(workdir, records)
+        for name, writer in (('csv', export.write_csv),
+                             ('jsonl', export.write_jsonl)):
+            # The peak resident memory only grows if exporting needs more
+            # than generating the history did
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = time.perf_counter()
+            with open(os.devnull, 'w') as output:
+                writer(export.history_lines(history_dir=workdir), output)
+            elapsed = time.perf_counter() - start
+            growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak
+            print(f'export {name}: {records} records in {elapsed:.2f} s '
+                  f'({records/elapsed:,.0f} records/s), peak memory grew '
+                  f'by {growth} KiB')
+
+
+if __name__ == '__main__':
+    args = docopt(__doc__)
+    if args['report']:
+        _report(int(args['--people']), int(args['--records']))
+    if args['export']:
+        _export(int(args['--records']))
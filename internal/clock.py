@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import time
+
+
+class Clock:
+    """The real clock."""
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """A clock that only moves when slept on.
+
+    Sleeping returns immediately, after advancing the clock, so that any
+    amount of time can be simulated in no time at all.
+    """
+
+    def __init__(self, start=None):
+        self._start = time.time() if start is None else start
+        self._elapsed = 0.
+
+    def monotonic(self):
+        return self._elapsed
+
+    def time(self):
+        return self._start + self._elapsed
+
+    def sleep(self, seconds):
+        self._elapsed += seconds
@@ -2,12 +2,31 @@
 # -*- encoding: utf-8 -*-
 
 import os
+import copy
 import json
 
+from internal.errors import ConfigurationError
+
 _PATH = os.path.dirname(os.path.realpath(__file__))
 _JSON = "data.json"
+_BUNDLED = ('pomodoro.wav', 'break.wav')
+# Bumped, with a migration added to _MIGRATIONS, whenever properties are
+# added or changed
+SCHEMA_VERSION = 1
+
+# When pomo runs from a zipapp, this directory is inside the archive. The
+# configuration is then kept in the user's data directory instead, and the
+# bundled sounds are extracted there on first use.
+_ZIPPED = not os.path.isdir(_PATH)
+if _ZIPPED:
+    _ARCHIVE_PATH = os.path.dirname(__file__)
+    _PATH = os.path.join(
+            os.environ.get('XDG_DATA_HOME')
+            or os.path.join(os.path.expanduser('~'), '.local', 'share'),
+            'pomo')
 
 _DEFAULT_JSON = {
+        "schema_version": SCHEMA_VERSION,
         "config": {
             "pomodoro": {
                 "name": "Length of pomodoro timer (in seconds)",
@@ -24,10 +43,17 @@ _DEFAULT_JSON = {
                 "value": 1800,
                 "type": "time"
             },
+            "cycle": {
+                "name": "The phases of a cycle, which repeats: \"work\", "
+                        "\"short\" and \"long\", separated by spaces.",
+                "value": "work short work short work short work long",
+                "type": "cycle"
+            },
             "editor": {
-                "name": "The editor to use for writing tasks.",
-                "value": "/usr/bin/vim",
-                "type": "exe"
+                "name": "The editor to use for writing tasks, or "
+                        "\"builtin\" to write them in the terminal.",
+                "value": "builtin",
+                "type": "editor"
             },
             "sound": {
                 "name": "The sound to play when a pomodoro ends.",
@@ -38,6 +64,38 @@ _DEFAULT_JSON = {
                 "name": "The sound to play when a break ends.",
                 "value": os.path.join(_PATH, 'break.wav'),
                 "type": "file?"
+            },
+            "on-pomodoro-start": {
+                "name": "Shell command to run when a pomodoro starts.",
+                "value": "",
+                "type": "cmd?"
+            },
+            "on-pomodoro-end": {
+                "name": "Shell command to run when a pomodoro ends.",
+                "value": "",
+                "type": "cmd?"
+            },
+            "on-break-start": {
+                "name": "Shell command to run when a break starts.",
+                "value": "",
+                "type": "cmd?"
+            },
+            "on-break-end": {
+                "name": "Shell command to run when a break ends.",
+                "value": "",
+                "type": "cmd?"
+            },
+            "hook-timeout": {
+                "name": "Time a hook command may run before it is killed "
+                        "(in seconds)",
+                "value": 10,
+                "type": "time"
+            },
+            "sync-dir": {
+                "name": "A directory shared between machines, through which "
+                        "they share their history and configuration.",
+                "value": "",
+                "type": "dir?"
             }
         }
     }
@@ -45,12 +103,79 @@ _DEFAULT_JSON = {
 def get_internal_path():
     return _PATH
 
+def _extract_bundled():
+    os.makedirs(_PATH, exist_ok=True)
+    for name in _BUNDLED:
+        target = os.path.join(_PATH, name)
+        if not os.path.exists(target):
+            data = __loader__.get_data(os.path.join(_ARCHIVE_PATH, name))
+            with open(target, 'wb') as target_file:
+                target_file.write(data)
+
 def get_configuration():
+    if _ZIPPED:
+        _extract_bundled()
     json_name = os.path.join(_PATH, _JSON)
     return _Config(json_name)
 
 def get_default_configuration():
-    return _DEFAULT_JSON
+    """A copy of the default configuration, which the caller may change."""
+    return copy.deepcopy(_DEFAULT_JSON)
+
+def get_configuration_mtime():
+    """The modification time of the configuration file, in nanoseconds, or
+    None if it does not exist yet."""
+    try:
+        return os.stat(os.path.join(_PATH, _JSON)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def read_configuration():
+    """Load the configuration without writing it back.
+
+    Raises `ValueError` if the file cannot be parsed (for example, because
+    it is being written).
+    """
+    return _read(os.path.join(_PATH, _JSON))[0]
+
+
+def _from_unversioned(config):
+    # Properties added since the file was written take their default
+    # values, and names and types are brought up to date (the editor
+    # became its own type, to accept "builtin")
+    for prop, default in _DEFAULT_JSON['config'].items():
+        if prop not in config['config']:
+            config['config'][prop] = copy.deepcopy(default)
+        else:
+            config['config'][prop]['name'] = default['name']
+            config['config'][prop]['type'] = default['type']
+
+
+# _MIGRATIONS[n] upgrades a configuration from schema version n to n + 1.
+# Files written before the schema was versioned are version 0.
+_MIGRATIONS = (
+    _from_unversioned,
+)
+
+
+def _read(json_name):
+    """Load the configuration, upgrading it to the current schema.
+
+    Returns `(config, changed)`; `changed` is true if the configuration
+    differs from the file (which may not exist yet).
+    """
+    if not os.path.exists(json_name):
+        return get_default_configuration(), True
+    with open(json_name, 'r') as json_file:
+        config = json.load(json_file)
+    version = config.get('schema_version', 0)
+    # A file from a newer version of pomo is used as it is
+    for migration in _MIGRATIONS[version:]:
+        migration(config)
+    if version >= SCHEMA_VERSION:
+        return config, False
+    config['schema_version'] = SCHEMA_VERSION
+    return config, True
 
 
 class _Config:
@@ -59,21 +184,20 @@ class _Config:
 
     def __enter__(self):
         # Load the json file into memory
-        if os.path.exists(self.json_name):
-            with open(self.json_name, 'r') as json_file:
-                try:
-                    self.json = json.load(json_file)
-                except json.JSONDecodeError:
-                    print('Failed to parse the configuration file, '
-                            f'found in "{self.json_name}". Please delete or '
-                            'manually fix the file.')
-                    exit(1)
-        else:
-            self.json = _DEFAULT_JSON
+        try:
+            self.json, changed = _read(self.json_name)
+        except json.JSONDecodeError:
+            raise ConfigurationError(
+                    'Failed to parse the configuration file, '
+                    f'found in "{self.json_name}". Please delete or '
+                    'manually fix the file.')
+        # The file is only written again if something changed
+        self._saved = None if changed else json.dumps(self.json)
         return self.json
-    
+
     def __exit__(self, type, value, traceback):
         # Write the json into disk
+        if self._saved is not None and json.dumps(self.json) == self._saved:
+            return
         with open(self.json_name, 'w') as json_file:
             json.dump(self.json, json_file)
-
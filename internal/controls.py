@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import os
+import select
+import sys
+from time import sleep
+
+try:
+    import termios
+    import tty
+except ImportError:
+    termios = None
+
+PAUSE = 'pause'
+SKIP = 'skip'
+EXTEND = 'extend'
+QUIT = 'quit'
+
+_KEYS = {
+    'p': PAUSE,
+    ' ': PAUSE,
+    's': SKIP,
+    '+': EXTEND,
+    'e': EXTEND,
+    'q': QUIT,
+}
+
+HELP = 'Keys: [p]ause/resume, [s]kip phase, [+] five more minutes, [q]uit'
+
+
+class Keyboard:
+    """Single-key controls read from stdin.
+
+    While the context is active, the terminal is put in cbreak mode. stdin
+    is left blocking: on a terminal it usually shares its file description
+    with stdout, which must stay blocking. If stdin is not a terminal, or `enabled` is false,
+    the keyboard is disabled and `wait` only sleeps.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = (enabled and termios is not None
+                        and sys.stdin.isatty())
+        self._saved_mode = None
+
+    def __enter__(self):
+        if self.enabled:
+            self._fd = sys.stdin.fileno()
+            self._saved_mode = termios.tcgetattr(self._fd)
+            tty.setcbreak(self._fd)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if self._saved_mode is not None:
+            termios.tcsetattr(self._fd, termios.TCSADRAIN, self._saved_mode)
+            self._saved_mode = None
+
+    def wait(self, timeout):
+        """Wait for a key press, or until `timeout` seconds have passed.
+
+        A `timeout` of None waits for a key press only. Returns the command
+        for the key that was pressed, or None.
+        """
+        if not self.enabled:
+            if timeout is not None:
+                sleep(timeout)
+            return None
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return None
+        # select says there is input, so this doesn't block
+        keys = os.read(self._fd, 32).decode(errors='ignore')
+        for key in keys:
+            command = _KEYS.get(key.lower())
+            if command is not None:
+                return command
+        return None
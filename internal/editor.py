@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
 # -*- encoding: utf-8 -*-
 
-import tempfile
 import os
 from subprocess import call
 
+# The `editor` value that selects the built-in task prompt
+BUILTIN = 'builtin'
+
+
 def get_input_from_editor(initial_msg, editor_exe):
+    # Only needed for an external editor
+    import tempfile
+
     with tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as tf:
         tf.write(initial_msg.encode('utf-8'))
         tf.flush()
@@ -13,8 +19,36 @@ def get_input_from_editor(initial_msg, editor_exe):
 
     with open(tf.name, 'r') as tf:
         edited_msg = tf.read()
-    
+
     os.remove(tf.name)
-    
+
     return edited_msg
 
+
+def get_tasks_from_terminal():
+    """Ask for tasks in the terminal, one per line, until an empty line.
+
+    Lines can be edited as usual (with readline's keys, where it is
+    available). Returns the tasks given; none if input is interrupted.
+    """
+    try:
+        # Importing readline is enough for input() to use it
+        import readline
+    except ImportError:
+        pass
+
+    print('Write your tasks, one per line. '
+          'Leave a line empty once you\'re done.')
+    tasks = []
+    try:
+        while True:
+            task = input(f'  [{len(tasks)}]: ').strip()
+            if not task:
+                break
+            tasks.append(task)
+    except EOFError:
+        print('')
+    except KeyboardInterrupt:
+        print('')
+        return []
+    return tasks
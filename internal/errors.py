@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+
+class PomoError(Exception):
+    """An error to report to the user. Its message says what went wrong,
+    and how to fix it if the user can."""
+
+
+class ConfigurationError(PomoError):
+    """The configuration cannot be read, or holds a value pomo cannot
+    use."""
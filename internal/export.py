@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import csv
+import json
+import operator
+import os
+
+from internal import history
+from internal.ledger import Entry
+
+FIELDS = Entry._fields + ('tasks', 'host', 'id')
+_TASKS = FIELDS.index('tasks')
+_get_fields = operator.itemgetter(*FIELDS)
+
+
+def history_lines(since=None, until=None, history_dir=None):
+    """Stream the history's records that started in [since, until), as
+    `(record, line)` pairs.
+
+    Records come shard by shard (month by month), each in the order it was
+    written, so that nothing but the current line is held in memory. Only
+    the shards at either end of the range are filtered record by record.
+    """
+    first = history.shard_name(since) if since is not None else None
+    last = history.shard_name(until) if until is not None else None
+    for path in history.shards(since, until, history_dir):
+        name = os.path.basename(path)
+        check = name == first or name == last
+        with open(path, 'r') as shard:
+            for line in shard:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Cut short by a crash
+                    continue
+                if check and ((since is not None and record['start'] < since)
+                              or (until is not None
+                                  and record['start'] >= until)):
+                    continue
+                if not line.endswith('\n'):
+                    line += '\n'
+                yield record, line
+
+
+def _row(record):
+    try:
+        row = list(_get_fields(record))
+    except KeyError:
+        # Records from older versions lack some fields
+        row = [record.get(field) for field in FIELDS]
+    # Tasks are a list, kept as a JSON array in their one column
+    tasks = row[_TASKS]
+    row[_TASKS] = json.dumps(tasks) if tasks else '[]'
+    return row
+
+
+def write_csv(lines, output):
+    writer = csv.writer(output)
+    writer.writerow(FIELDS)
+    writer.writerows(_row(record) for record, _ in lines)
+
+
+def write_jsonl(lines, output):
+    # The lines are already JSON; they are copied as they are
+    output.writelines(line for _, line in lines)
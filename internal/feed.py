@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import os
+import stat
+import sys
+
+from internal.errors import PomoError
+from internal.status import format_segment, phase_code
+
+
+def feed_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'pomo.feed')
+    return os.path.join('/tmp', f'pomo-{os.getuid()}.feed')
+
+
+class Feed:
+    """Pushes the displayed phase and time left to a named pipe.
+
+    A line is written only when the displayed value changes (about once a
+    second), and never blocks: if nobody is reading the pipe, or the reader
+    is behind, the update is dropped. Status bars read the pipe through
+    `pomo feed`, so they update as soon as the value changes and use no CPU
+    in between.
+
+    Each line holds the phase code, the seconds left and whether the phase
+    is paused; `follow` formats it for display.
+    """
+
+    def __init__(self, path=None):
+        self.path = feed_path() if path is None else path
+        self._fd = None
+        self._phase = None
+        self._shown = None
+
+    def _publish(self, text):
+        if self._fd is None:
+            try:
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                # No pipe, or no reader on it
+                return
+        try:
+            os.write(self._fd, (text + '\n').encode('ascii'))
+        except BlockingIOError:
+            pass
+        except OSError:
+            # The reader went away
+            os.close(self._fd)
+            self._fd = None
+
+    def set_phase(self, phase):
+        self._phase = phase_code(phase)
+
+    def update(self, remaining, paused):
+        shown = (self._phase, int(remaining + .5), int(paused))
+        if shown != self._shown:
+            self._shown = shown
+            self._publish('%d %d %d' % shown)
+
+    def close(self):
+        self._publish('')
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def follow(path=None):
+    """Copy the feed to stdout, one line per change, forever.
+
+    Blocks on the pipe while no session is running, or while nothing
+    changes. Each session ends its updates with an empty line.
+    """
+    path = feed_path() if path is None else path
+    try:
+        os.mkfifo(path, 0o600)
+    except FileExistsError:
+        if not stat.S_ISFIFO(os.stat(path).st_mode):
+            raise PomoError(f'"{path}" exists and is not a named pipe.')
+    try:
+        while True:
+            with open(path, 'r', encoding='ascii', errors='replace') as pipe:
+                for line in pipe:
+                    fields = line.split()
+                    if len(fields) == 3:
+                        phase, remaining, paused = map(int, fields)
+                        line = format_segment(phase, remaining, paused,
+                                              sys.stdout.encoding)
+                    else:
+                        line = ''
+                    print(line, flush=True)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import json
+import os
+import re
+import socket
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from internal.config import get_internal_path
+
+# The session history is sharded into one JSON-lines file per month
+# (YYYY-MM.jsonl, by the local time each phase started), so that appending
+# stays cheap and reports only read the months they cover.
+_SHARD_SUFFIX = '.jsonl'
+
+
+def history_path():
+    return os.path.join(get_internal_path(), 'history')
+
+
+@contextmanager
+def locked(name, history_dir=None, shared=False):
+    """Hold a lock on the file `name` in the history directory, shared or
+    exclusive, for the duration of the context."""
+    path = history_path() if history_dir is None else history_dir
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, name), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        # Closing the file releases the lock
+        yield
+
+
+def shard_name(timestamp):
+    return time.strftime('%Y-%m', time.localtime(timestamp)) + _SHARD_SUFFIX
+
+
+def append(records, history_dir=None):
+    """Append records to the shards of the months they started in."""
+    path = history_path() if history_dir is None else history_dir
+    os.makedirs(path, exist_ok=True)
+    by_shard = {}
+    for record in records:
+        by_shard.setdefault(shard_name(record['start']), []).append(
+                json.dumps(record) + '\n')
+    for name, lines in by_shard.items():
+        with open(os.path.join(path, name), 'a') as shard:
+            shard.writelines(lines)
+
+
+def host_name():
+    return re.sub(r'[^A-Za-z0-9._-]', '_', socket.gethostname())
+
+
+def new_id():
+    return uuid.uuid4().hex
+
+
+def record(entry, tasks=(), history_dir=None):
+    """Append a finished phase (a ledger `Entry`) to the history, and
+    return the record that was written."""
+    data = {**entry._asdict(), 'tasks': list(tasks),
+            'host': host_name(), 'id': new_id()}
+    append((data,), history_dir)
+    return data
+
+
+def known_ids(history_dir=None):
+    """The ids of all records in the history."""
+    path = history_path() if history_dir is None else history_dir
+    if not os.path.isdir(path):
+        return set()
+    return {entry.get('id') for name in os.listdir(path)
+            if name.endswith(_SHARD_SUFFIX)
+            for entry in read(os.path.join(path, name))}
+
+
+def shards(since=None, until=None, history_dir=None):
+    """The paths of the shards that may hold phases that started in
+    [since, until), oldest first."""
+    path = history_path() if history_dir is None else history_dir
+    if not os.path.isdir(path):
+        return []
+    first = shard_name(since) if since is not None else ''
+    last = shard_name(until) if until is not None else None
+    names = sorted(name for name in os.listdir(path)
+                   if name.endswith(_SHARD_SUFFIX) and name >= first
+                   and (last is None or name <= last))
+    return [os.path.join(path, name) for name in names]
+
+
+def read(path):
+    """The records in one shard, skipping lines that can't be parsed (such
+    as one cut short by a crash)."""
+    with open(path, 'r') as shard:
+        for line in shard:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                pass
+
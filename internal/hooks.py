@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import os
+import queue
+import signal
+import threading
+from collections import deque
+from subprocess import Popen, DEVNULL, TimeoutExpired
+from time import monotonic
+
+POMODORO_START = 'pomodoro-start'
+POMODORO_END = 'pomodoro-end'
+BREAK_START = 'break-start'
+BREAK_END = 'break-end'
+EVENTS = (POMODORO_START, POMODORO_END, BREAK_START, BREAK_END)
+
+# Hooks (and sounds) run in a small pool of daemon threads, fed by a
+# bounded queue. When the queue is full, new jobs are dropped rather than
+# waited on, so a slow or hung hook can never delay the countdown.
+_WORKERS = 2
+_QUEUE_SIZE = 8
+# Threads cannot be killed. A worker whose job runs past its deadline is
+# given up on, and replaced; it ends once its job does. Lost or not, no
+# more than this many threads ever run hooks.
+_MAX_THREADS = 6
+# The time given to jobs submitted without a timeout
+_DEFAULT_TIMEOUT = 60
+# Hook commands are killed when they run out of time; their job gets a
+# little longer, for that
+_KILL_GRACE = 2
+
+_queue = queue.Queue(_QUEUE_SIZE)
+_workers = []
+_lost = []
+_workers_lock = threading.Lock()
+# Jobs that were dropped, failed or ran out of time, for `problems`
+_problems = deque(maxlen=16)
+
+
+class _Worker(threading.Thread):
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        # The running job's name and deadline
+        self.job = None
+        self.deadline = None
+        self.lost = False
+
+    def run(self):
+        while True:
+            function, args, name, timeout = _queue.get()
+            with _workers_lock:
+                self.job = name
+                self.deadline = monotonic() + timeout
+            try:
+                function(*args)
+            except Exception as error:
+                # A failing hook must not take the session down with it.
+                _problems.append(f'{name} failed: {error}')
+            with _workers_lock:
+                self.job = self.deadline = None
+                if self.lost:
+                    _lost.remove(self)
+                    return
+
+
+def _check_workers():
+    # Called with _workers_lock held
+    now = monotonic()
+    for worker in list(_workers):
+        if worker.deadline is not None and worker.deadline < now:
+            _problems.append(f'{worker.job} ran out of time, and was left '
+                             'running in the background.')
+            worker.lost = True
+            _workers.remove(worker)
+            _lost.append(worker)
+    while (len(_workers) < _WORKERS
+           and len(_workers) + len(_lost) < _MAX_THREADS):
+        worker = _Worker()
+        worker.start()
+        _workers.append(worker)
+
+
+def submit(function, *args, timeout=None, name=None):
+    """Run `function(*args)` in the worker pool, within `timeout` seconds.
+
+    Returns whether the job was accepted; it is dropped if the pool is
+    saturated. A job that runs out of time cannot be stopped, but its worker
+    is replaced. Either way, the job is listed by `problems`.
+    """
+    if name is None:
+        name = getattr(function, '__name__', repr(function))
+    if timeout is None:
+        timeout = _DEFAULT_TIMEOUT
+    with _workers_lock:
+        _check_workers()
+    try:
+        _queue.put_nowait((function, args, name, timeout))
+        return True
+    except queue.Full:
+        _problems.append(f'{name} was dropped: too many hooks were '
+                         'already waiting.')
+        return False
+
+
+def problems():
+    """The hooks that were dropped, failed or ran out of time since this was
+    last called, as messages (only the latest are kept)."""
+    messages = []
+    while _problems:
+        messages.append(_problems.popleft())
+    return messages
+
+
+def _run_command(command, env, timeout):
+    # The command gets its own process group, so that everything it spawns
+    # can be killed if it runs out of time.
+    process = Popen(command, shell=True, env=env, stdin=DEVNULL,
+                    stdout=DEVNULL, stderr=DEVNULL, start_new_session=True)
+    try:
+        process.wait(timeout)
+    except TimeoutExpired:
+        _problems.append(f'"{command}" ran for more than {timeout} s, and '
+                         'was killed.')
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (AttributeError, ProcessLookupError):
+            process.kill()
+        process.wait()
+        return
+    if process.returncode != 0:
+        _problems.append(f'"{command}" failed, with exit status '
+                         f'{process.returncode}.')
+
+
+def fire(event, command=None, timeout=None, **context):
+    """Run the hook command for `event`.
+
+    `command` is a shell command, as configured by the user, which is
+    killed after `timeout` seconds. The `context` is passed to it as
+    `POMO_<KEY>` environment variables.
+    """
+    if command:
+        env = dict(os.environ, POMO_EVENT=event)
+        env.update((f'POMO_{key.upper()}', str(value))
+                   for key, value in context.items())
+        submit(_run_command, command, env, timeout,
+               timeout=None if timeout is None else timeout + _KILL_GRACE,
+               name=f'"{command}"')
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import time
+from collections import namedtuple
+
+from internal.timekeep import COMPLETED
+
+WORK = 'work'
+SHORT_BREAK = 'short'
+LONG_BREAK = 'long'
+PAUSE = 'pause'
+OVERRUN = 'overrun'
+
+PHASES = (WORK, SHORT_BREAK, LONG_BREAK)
+
+# One finished phase. `start` and `end` are wall-clock timestamps, derived
+# from the monotonic clock; `elapsed` excludes the time spent paused, and
+# `overrun` is the part of `elapsed` beyond what was `planned`.
+Entry = namedtuple('Entry', ('kind', 'start', 'end', 'planned', 'elapsed',
+                             'paused', 'overrun', 'status'))
+
+
+class Ledger:
+    """Time accounting for a session.
+
+    Every phase is timed with the monotonic clock, so that changes to the
+    wall clock do not skew the totals. Wall-clock times are only derived
+    from it, relative to the session's start. Only the totals are kept;
+    each phase's `Entry` goes to whoever ends it, so a ledger's size
+    doesn't grow with the session.
+    """
+
+    def __init__(self, clock=time.monotonic, wall_clock=time.time):
+        self._clock = clock
+        self._anchor_wall = wall_clock()
+        self._anchor = clock()
+        self.totals = dict.fromkeys(PHASES + (PAUSE, OVERRUN), 0.)
+        self.completed = dict.fromkeys(PHASES, 0)
+        self._phase = None
+        self._paused_at = None
+
+    def wall_time(self, moment):
+        return self._anchor_wall + (moment - self._anchor)
+
+    def begin(self, kind, planned):
+        """Start timing a phase of `kind`, planned to last `planned`
+        seconds."""
+        self._phase = (kind, planned, self._clock())
+        self._paused_at = None
+        self._phase_paused = 0.
+
+    def pause(self):
+        if self._phase is not None and self._paused_at is None:
+            self._paused_at = self._clock()
+
+    def resume(self):
+        if self._paused_at is not None:
+            paused = self._clock() - self._paused_at
+            self._paused_at = None
+            self._phase_paused += paused
+            self.totals[PAUSE] += paused
+
+    def end(self, status):
+        """Stop timing the current phase, if any, and return its `Entry`."""
+        if self._phase is None:
+            return None
+        self.resume()
+        kind, planned, start = self._phase
+        self._phase = None
+        end = self._clock()
+        elapsed = end - start - self._phase_paused
+        overrun = max(0., elapsed - planned)
+        self.totals[kind] += elapsed
+        self.totals[OVERRUN] += overrun
+        if status == COMPLETED:
+            self.completed[kind] += 1
+        entry = Entry(kind, self.wall_time(start), self.wall_time(end),
+                      planned, elapsed, self._phase_paused, overrun, status)
+        return entry
@@ -1,22 +1,52 @@
 #!/usr/bin/env python3
 # -*- encoding: utf-8 -*-
 
-from subprocess import run, DEVNULL 
+import threading
+from subprocess import run, DEVNULL, SubprocessError
+
+# Seconds a single `notify-send` call may take before it is killed.
+_TIMEOUT = 5
+
+# Notifications are delivered by a background thread, so that the timer
+# never waits on the notification daemon. Only the latest notification is
+# kept pending: if a new one arrives before the previous one was delivered,
+# the previous one is stale and is dropped.
+_condition = threading.Condition()
+_pending = None
+_worker = None
+_enabled = None
+
+
+def _notify_send(*args):
+    try:
+        return run(['notify-send', *args], stdout=DEVNULL, stderr=DEVNULL,
+                   timeout=_TIMEOUT).returncode == 0
+    except (OSError, SubprocessError):
+        return False
+
+
+def _deliver():
+    global _pending, _enabled
+    _enabled = _notify_send('-v')
+    while _enabled:
+        with _condition:
+            while _pending is None:
+                _condition.wait()
+            args, _pending = _pending, None
+        _notify_send(*args)
 
-_enabled = \
-    (run(['notify-send', '-v'], stdout=DEVNULL, stderr=DEVNULL).returncode == 0)
 
 def notification(title, body=None):
-    if not _enabled:
+    global _pending, _worker
+    if _enabled is False:
         return None
-    if body is None:
-        run(['notify-send', title])
-    else:
-        run(['notify-send', title, body])
+    with _condition:
+        _pending = (title,) if body is None else (title, body)
+        if _worker is None:
+            _worker = threading.Thread(target=_deliver, daemon=True)
+            _worker.start()
+        _condition.notify()
 
 def notify_and_print(text, *print_args, **print_kwargs):
-    # NOTE: Print should come before the notification,
-    # so that if a UnicodeEncodingError is raised, the
-    # notification is never sent.
     print(text, *print_args, **print_kwargs)
     notification(text)
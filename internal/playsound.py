@@ -70,8 +70,161 @@ def _playsoundOSX(sound, block = True):
     if block:
         sleep(nssound.duration())
 
+# Players that read raw PCM from stdin, in order of preference, with the
+# names they give to 8, 16, 24 and 32-bit samples
+_PCM_PLAYERS = (
+    (lambda fmt, channels, rate: ['aplay', '-q', '-t', 'raw', '-f', fmt,
+                                  '-c', str(channels), '-r', str(rate), '-'],
+     {1: 'U8', 2: 'S16_LE', 3: 'S24_3LE', 4: 'S32_LE'}),
+    (lambda fmt, channels, rate: ['pacat', '--playback', '--raw',
+                                  '--format=' + fmt, '--channels=' + str(channels),
+                                  '--rate=' + str(rate)],
+     {1: 'u8', 2: 's16le', 3: 's24le', 4: 's32le'}),
+    (lambda fmt, channels, rate: ['pw-play', '--raw', '--format', fmt,
+                                  '--channels', str(channels),
+                                  '--rate', str(rate), '-'],
+     {1: 'u8', 2: 's16', 3: 's24', 4: 's32'}),
+)
+
+from threading import Condition, Lock, Thread
+from time import monotonic
+
+# Players are started once for each sample format, and kept running while
+# sounds come, so that playing a sound only means writing its samples to a
+# pipe. Once idle for a while, they are closed, so as not to hold on to the
+# sound device.
+_players = {}
+_players_lock = Lock()
+_players_changed = Condition(_players_lock)
+_last_play = 0.
+_reaper = None
+_IDLE_TIMEOUT = 30
+# A player that hasn't taken a sound's samples by the end of the sound, and
+# this many seconds, is stalled
+_WRITE_SLACK = 2
+
+
+def _pcm_player(params):
+    from shutil import which
+    from subprocess import Popen, PIPE, DEVNULL
+
+    player = _players.get(params)
+    if player is not None and player.poll() is None:
+        return player
+    channels, sampwidth, rate = params
+    for command, formats in _PCM_PLAYERS:
+        args = command(formats[sampwidth], channels, rate)
+        if which(args[0]) is None:
+            continue
+        player = Popen(args, stdin=PIPE, stdout=DEVNULL, stderr=DEVNULL,
+                       bufsize=0)
+        _players[params] = player
+        return player
+    return None
+
+
+def _close_player(player, kill=False):
+    from subprocess import TimeoutExpired
+
+    if not kill:
+        try:
+            # The player ends once it has played what it was given
+            player.stdin.close()
+            player.wait(_WRITE_SLACK)
+            return
+        except (OSError, TimeoutExpired):
+            pass
+    player.kill()
+    player.wait()
+
+
+def _reap_idle_players():
+    while True:
+        with _players_lock:
+            while not _players:
+                _players_changed.wait()
+            idle = monotonic() - _last_play
+            if idle < _IDLE_TIMEOUT:
+                _players_changed.wait(_IDLE_TIMEOUT - idle)
+                continue
+            players = list(_players.values())
+            _players.clear()
+        for player in players:
+            _close_player(player)
+
+
+def _write(fd, data, timeout):
+    """Write `data` to the pipe `fd`, unless it takes more than `timeout`
+    seconds. Returns whether it was all written."""
+    import os
+    import select
+
+    deadline = monotonic() + timeout
+    data = memoryview(data)
+    while data:
+        remaining = deadline - monotonic()
+        if remaining <= 0 or not select.select([], [fd], [], remaining)[1]:
+            return False
+        # A writable pipe takes PIPE_BUF bytes without blocking
+        data = data[os.write(fd, data[:select.PIPE_BUF]):]
+    return True
+
+
+def _playsoundWave(sound):
+    """Play an uncompressed WAV file through a player process.
+
+    If $POMO_SOUND_SINK is set, the samples are appended to the file it
+    names instead. Returns False if the file cannot be played this way.
+    """
+    import os
+    import wave
+    global _last_play, _reaper
+
+    try:
+        with wave.open(sound, 'rb') as wav:
+            params = (wav.getnchannels(), wav.getsampwidth(),
+                      wav.getframerate())
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError, OSError):
+        # Not a WAV file, or a format the wave module doesn't read
+        return False
+    if params[1] not in _PCM_PLAYERS[0][1]:
+        return False
+
+    sink = os.environ.get('POMO_SOUND_SINK')
+    if sink:
+        with open(sink, 'ab') as sink_file:
+            sink_file.write(frames)
+        return True
+
+    channels, sampwidth, rate = params
+    length = len(frames) / (channels*sampwidth*rate)
+    # Sounds are played one after the other; the pipe paces the writes
+    with _players_lock:
+        player = _pcm_player(params)
+        if player is None:
+            return False
+        try:
+            played = _write(player.stdin.fileno(), frames,
+                            length + _WRITE_SLACK)
+        except OSError:
+            # The player died
+            played = False
+        if not played:
+            # It is started again next time
+            del _players[params]
+            _close_player(player, kill=True)
+        _last_play = monotonic()
+        if _reaper is None:
+            _reaper = Thread(target=_reap_idle_players, daemon=True)
+            _reaper.start()
+        _players_changed.notify()
+    return played
+
+
 def _playsoundNix(sound, block=True):
-    """Play a sound using GStreamer.
+    """Play a sound, through a light WAV player if it can, or else using
+    GStreamer.
 
     Inspired by this:
     https://gstreamer.freedesktop.org/documentation/tutorials/playback/playbin-usage.html
@@ -80,6 +233,10 @@ def _playsoundNix(sound, block=True):
         raise NotImplementedError(
             "block=False cannot be used on this platform yet")
 
+    if not sound.startswith(('http://', 'https://')) \
+            and _playsoundWave(sound):
+        return
+
     # pathname2url escapes non-URL-safe characters
     import os
     try:
@@ -112,14 +269,14 @@ def _playsoundNix(sound, block=True):
     playbin.set_state(Gst.State.NULL)
 
 
-from platform import system
-system = system()
+# sys.platform is known without importing the platform module
+from sys import platform
 
-if system == 'Windows':
+if platform == 'win32':
     playsound = _playsoundWin
-elif system == 'Darwin':
+elif platform == 'darwin':
     playsound = _playsoundOSX
 else:
     playsound = _playsoundNix
 
-del system
\ No newline at end of file
+del platform
\ No newline at end of file
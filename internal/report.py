@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import csv
+import heapq
+import json
+import os
+import time
+
+from internal import history
+from internal.ledger import WORK, SHORT_BREAK, LONG_BREAK
+from internal.timekeep import COMPLETED
+
+TEAM = '(team)'
+FIELDS = ('week', 'person', 'pomodoros', 'work_seconds', 'break_seconds',
+          'pause_seconds')
+
+
+def person_name(directory):
+    directory = os.path.normpath(os.path.abspath(directory))
+    if os.path.basename(directory) == 'history':
+        directory = os.path.dirname(directory)
+    return os.path.basename(directory)
+
+
+def _sort_key(record):
+    return (record['start'], record.get('host', ''), record.get('id', ''))
+
+
+def person_records(directory, since=None, until=None):
+    """Stream one person's records, oldest first.
+
+    Shards are read one at a time. A shard is not necessarily in order
+    (merged records are appended as they arrive), so each is sorted on its
+    own, which only holds one month of one person in memory.
+    """
+    for path in history.shards(since, until, directory):
+        records = [record for record in history.read(path)
+                   if (since is None or record['start'] >= since)
+                   and (until is None or record['start'] < until)]
+        records.sort(key=_sort_key)
+        yield from records
+
+
+def _keyed(person, records):
+    # Each record is yielded behind its sort key, so that the heap compares
+    # plain tuples instead of calling a key function.
+    for record in records:
+        yield _sort_key(record) + (person,), record
+
+
+def merged_records(directories, since=None, until=None):
+    """Stream the records of many people as one, oldest first, as
+    `(person, record)` pairs.
+
+    This is a k-way merge on a heap, so at most one shard per person is
+    held in memory at a time.
+    """
+    streams = [_keyed(person_name(directory),
+                      person_records(directory, since, until))
+               for directory in directories]
+    for key, record in heapq.merge(*streams, key=_first):
+        yield key[-1], record
+
+
+def _first(item):
+    return item[0]
+
+
+def _week(timestamp):
+    """The ISO week `timestamp` falls in, and when that week ends."""
+    local = time.localtime(timestamp)
+    end = time.mktime((local.tm_year, local.tm_mon,
+                       local.tm_mday - local.tm_wday + 7, 0, 0, 0, 0, 0, -1))
+    return time.strftime('%G-W%V', local), end
+
+
+def _empty_row(week, person):
+    return {'week': week, 'person': person, 'pomodoros': 0,
+            'work_seconds': 0., 'break_seconds': 0., 'pause_seconds': 0.}
+
+
+def weekly_rows(merged):
+    """Aggregate merged records into per-person and team rows, per ISO
+    week.
+
+    Weeks come out in order, each as soon as the merge moves past it, so
+    only the current week's rows are kept in memory.
+    """
+    week = None
+    week_end = float('-inf')
+    rows = {}
+    for person, record in merged:
+        # Records come in order, so the week only changes past its end
+        if record['start'] >= week_end:
+            yield from _week_rows(week, rows)
+            week, week_end = _week(record['start'])
+            rows = {}
+        for name in (person, TEAM):
+            row = rows.get(name)
+            if row is None:
+                row = rows[name] = _empty_row(week, name)
+            if record['kind'] == WORK:
+                row['work_seconds'] += record['elapsed']
+                if record['status'] == COMPLETED:
+                    row['pomodoros'] += 1
+            elif record['kind'] in (SHORT_BREAK, LONG_BREAK):
+                row['break_seconds'] += record['elapsed']
+            row['pause_seconds'] += record['paused']
+    yield from _week_rows(week, rows)
+
+
+def _week_rows(week, rows):
+    if week is None:
+        return
+    team = rows.pop(TEAM)
+    for person in sorted(rows):
+        yield rows[person]
+    yield team
+
+
+def write_csv(rows, output):
+    writer = csv.DictWriter(output, FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+
+
+def write_json(rows, output):
+    # Written row by row, so the whole report is never held in memory
+    output.write('[')
+    separator = '\n'
+    for row in rows:
+        output.write(separator + json.dumps(row))
+        separator = ',\n'
+    output.write('\n]\n')
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import json
+import os
+import shutil
+import time
+import zlib
+from contextlib import contextmanager
+
+from internal import history
+from internal.ledger import PHASES, WORK, PAUSE, OVERRUN
+from internal.timekeep import COMPLETED
+
+# Rollups are small tables of totals, kept next to the history and updated
+# as records are added to it, so that statistics never read the records
+# themselves:
+#
+#   rollups/days-YYYY-MM.json     one bucket per day of the month
+#   rollups/weeks-YYYY.json       one bucket per ISO week of the ISO year
+#   rollups/tasks-XX.json         one bucket per task whose name hashes to XX
+#
+# Days and weeks are split into files like the history is, and tasks by
+# hash, so that adding a record only rewrites a few small tables.
+#
+# Sessions, `pomo sync` and `pomo stats` may all use the rollups at once;
+# writers hold an exclusive lock on rollups.lock, and readers a shared one.
+_DIR = 'rollups'
+_LOCK = 'rollups.lock'
+_TASK_SHARDS = 256
+# Written once the rollups cover the whole history. The number is that of
+# the tables' layout; rollups in an older one are built again.
+_BUILT = 'built-2'
+
+
+def rollup_path(history_dir=None):
+    path = history.history_path() if history_dir is None else history_dir
+    return os.path.join(path, _DIR)
+
+
+def day_key(timestamp):
+    return time.strftime('%Y-%m-%d', time.localtime(timestamp))
+
+
+def week_key(timestamp):
+    return time.strftime('%G-W%V', time.localtime(timestamp))
+
+
+def _days_name(timestamp):
+    return time.strftime('days-%Y-%m.json', time.localtime(timestamp))
+
+
+def _weeks_name(timestamp):
+    return time.strftime('weeks-%G.json', time.localtime(timestamp))
+
+
+def _tasks_name(task):
+    return 'tasks-%02x.json' % (zlib.crc32(task.encode()) % _TASK_SHARDS)
+
+
+def empty_bucket():
+    """Totals of some phases. `days` counts the days with a pomodoro, and
+    is only kept for days and weeks."""
+    return {
+        'time': dict.fromkeys(PHASES + (PAUSE, OVERRUN), 0.),
+        'completed': dict.fromkeys(PHASES, 0),
+        'days': 0,
+    }
+
+
+def merge_buckets(total, partial):
+    for key, value in partial['time'].items():
+        total['time'][key] += value
+    for key, value in partial['completed'].items():
+        total['completed'][key] += value
+    total['days'] += partial['days']
+    return total
+
+
+def _load(path):
+    try:
+        with open(path, 'r') as table_file:
+            return json.load(table_file)
+    except (OSError, ValueError):
+        # A missing or damaged table starts over; `rebuild` repairs it
+        return {}
+
+
+def _store(path, table):
+    with open(path + '.tmp', 'w') as table_file:
+        json.dump(table, table_file)
+    os.replace(path + '.tmp', path)
+
+
+class _Tables:
+    """The tables touched by a batch of records, each loaded once (from
+    `path`, if given) and written back together."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.tables = {}
+
+    def bucket(self, name, key):
+        table = self.tables.get(name)
+        if table is None:
+            table = self.tables[name] = (
+                    _load(os.path.join(self.path, name))
+                    if self.path is not None else {})
+        bucket = table.get(key)
+        if bucket is None:
+            bucket = table[key] = empty_bucket()
+        return bucket
+
+    def merge(self, tables):
+        for name, table in tables.items():
+            for key, bucket in table.items():
+                merge_buckets(self.bucket(name, key), bucket)
+
+    def write(self, path=None):
+        path = self.path if path is None else path
+        os.makedirs(path, exist_ok=True)
+        for name, table in self.tables.items():
+            _store(os.path.join(path, name), table)
+
+
+def _add(tables, record):
+    start = record['start']
+    day = tables.bucket(_days_name(start), day_key(start))
+    week = tables.bucket(_weeks_name(start), week_key(start))
+    if record['kind'] == WORK and not day['days']:
+        # The day's first pomodoro also counts the day in its week
+        day['days'] = 1
+        week['days'] += 1
+    # A phase counts for every task of its session
+    buckets = [day, week] + [tables.bucket(_tasks_name(task), task)
+                             for task in dict.fromkeys(record.get('tasks', ()))]
+    kind = record['kind']
+    for bucket in buckets:
+        bucket['time'][kind] += record['elapsed']
+        bucket['time'][PAUSE] += record['paused']
+        bucket['time'][OVERRUN] += record['overrun']
+        if record['status'] == COMPLETED:
+            bucket['completed'][kind] += 1
+
+
+def add(records, history_dir=None):
+    """Add records, which were just appended to the history, to the
+    rollups.
+
+    Each record updates one bucket per day, week and task, in tables that
+    stay small however long the history is.
+    """
+    path = rollup_path(history_dir)
+    with history.locked(_LOCK, history_dir):
+        if not os.path.exists(os.path.join(path, _BUILT)):
+            # The first time, the rollups are built from the whole history,
+            # which already holds the new records
+            _rebuild(history_dir)
+            return
+        tables = _Tables(path)
+        for record in records:
+            _add(tables, record)
+        tables.write()
+
+
+def _rollup_shard(shard):
+    """The tables of the records of one shard of the history."""
+    tables = _Tables()
+    count = 0
+    for record in history.read(shard):
+        _add(tables, record)
+        count += 1
+    return tables.tables, count
+
+
+def _rebuild(history_dir):
+    # Called with the lock held
+    path = rollup_path(history_dir)
+    new_path, old_path = path + '.new', path + '.old'
+    shutil.rmtree(new_path, ignore_errors=True)
+    shards = history.shards(history_dir=history_dir)
+    if len(shards) > 1:
+        # Each shard is rolled up in its own process, and their tables are
+        # added up. A day belongs to a single shard, so the days counted in
+        # a week add up too.
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(len(shards),
+                                                 os.cpu_count() or 1)) \
+                as executor:
+            results = list(executor.map(_rollup_shard, shards))
+    else:
+        results = [_rollup_shard(shard) for shard in shards]
+    tables = _Tables()
+    count = 0
+    for shard_tables, shard_count in results:
+        tables.merge(shard_tables)
+        count += shard_count
+    tables.write(new_path)
+    open(os.path.join(new_path, _BUILT), 'w').close()
+    # The lock keeps readers out while the tables are swapped
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(new_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return count
+
+
+def rebuild(history_dir=None):
+    """Build the rollups again from the records in the history, replacing
+    the current ones. Returns the number of records read."""
+    with history.locked(_LOCK, history_dir):
+        return _rebuild(history_dir)
+
+
+@contextmanager
+def _reading(history_dir):
+    """The rollups' path, built if need be, and locked for reading."""
+    path = rollup_path(history_dir)
+    if not os.path.exists(os.path.join(path, _BUILT)):
+        with history.locked(_LOCK, history_dir):
+            if not os.path.exists(os.path.join(path, _BUILT)):
+                _rebuild(history_dir)
+    with history.locked(_LOCK, history_dir, shared=True):
+        yield path
+
+
+def _tables(path, first, last):
+    """The tables named from `first` to `last`, in order."""
+    names = sorted(name for name in os.listdir(path)
+                   if first <= name <= last and name.endswith('.json'))
+    for name in names:
+        yield _load(os.path.join(path, name))
+
+
+def totals(since=None, until=None, history_dir=None):
+    """The totals of the phases that started on the days from `since` up
+    to, but excluding, `until`."""
+    first = day_key(since) if since is not None else ''
+    last = day_key(until) if until is not None else None
+    total = empty_bucket()
+    with _reading(history_dir) as path:
+        for table in _tables(path,
+                             _days_name(since) if since is not None
+                             else 'days-',
+                             _days_name(until) if until is not None
+                             else 'days.'):
+            for day, bucket in table.items():
+                if day >= first and (last is None or day < last):
+                    merge_buckets(total, bucket)
+    return total
+
+
+def weeks(since, until=None, history_dir=None):
+    """The totals of the ISO weeks from `since` up to, but excluding,
+    `until`, as a dictionary keyed by week (such as "2021-W07")."""
+    first = week_key(since)
+    last = week_key(until) if until is not None else None
+    result = {}
+    with _reading(history_dir) as path:
+        for table in _tables(path, _weeks_name(since),
+                             _weeks_name(until) if until is not None
+                             else 'weeks.'):
+            result.update((week, bucket) for week, bucket in table.items()
+                          if week >= first and (last is None or week < last))
+    return result
+
+
+def tasks(history_dir=None):
+    """The totals of each task, as a dictionary keyed by task."""
+    result = {}
+    with _reading(history_dir) as path:
+        # A task is in a single table
+        for table in _tables(path, 'tasks-', 'tasks.'):
+            result.update(table)
+    return result
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import os
+import queue
+from functools import partial
+
+from internal import controls, hooks
+from internal.clock import Clock
+from internal.config import get_configuration, get_default_configuration, \
+        get_configuration_mtime, read_configuration
+from internal.errors import PomoError, ConfigurationError
+from internal.feed import Feed
+from internal.ledger import Ledger, WORK, SHORT_BREAK, LONG_BREAK
+from internal.playsound import playsound
+from internal.status import StatusFile
+from internal.terminal import supports_unicode
+from internal.timekeep import countdown_seconds, COMPLETED, QUIT
+from internal.timeline import Timeline, parse_cycle
+
+# Events, besides those of the phases (`hooks.EVENTS`)
+SETTINGS_CHANGE = 'settings-change'
+SESSION_END = 'session-end'
+EVENTS = hooks.EVENTS + (SETTINGS_CHANGE, SESSION_END)
+
+# The properties a session uses, which are picked up again if the
+# configuration changes during the session
+SESSION_PROPERTIES = ('pomodoro', 'short', 'long', 'cycle', 'sound',
+                      'break-sound', 'hook-timeout', 'sync-dir') + \
+        tuple(f'on-{event}' for event in hooks.EVENTS)
+
+
+def session_settings(config):
+    """The settings of a session, from a configuration."""
+    settings = {prop: config['config'][prop]['value']
+                for prop in SESSION_PROPERTIES}
+    for prop in ('pomodoro', 'short', 'long', 'hook-timeout'):
+        settings[prop] = int(settings[prop])
+    return settings
+
+
+# The property holding the duration of each phase
+DURATION_PROPERTIES = {WORK: 'pomodoro', SHORT_BREAK: 'short',
+                       LONG_BREAK: 'long'}
+
+
+def phase_durations(settings):
+    return {phase: settings[prop]
+            for phase, prop in DURATION_PROPERTIES.items()}
+
+
+def plan(settings, start=0., position=0, done=0):
+    """The schedule of a session with `settings` (see `Timeline`).
+
+    Raises `ConfigurationError` if the cycle is not valid, or its phases
+    all last no time.
+    """
+    try:
+        cycle = parse_cycle(settings['cycle'])
+    except ValueError as error:
+        raise ConfigurationError(
+                f'The cycle "{settings["cycle"]}" is not valid: {error}\n'
+                'Please set it with `pomo set cycle <phases>`.')
+    durations = phase_durations(settings)
+    if not sum(durations[phase] for phase in cycle) > 0:
+        props = [f'"{DURATION_PROPERTIES[phase]}"'
+                 for phase in dict.fromkeys(cycle)]
+        if len(props) > 1:
+            props[-2:] = [f'{props[-2]} or {props[-1]}']
+        raise ConfigurationError(
+                f'The phases of the cycle "{settings["cycle"]}" all last 0 '
+                f'seconds.\nPlease set {", ".join(props)} to more than 0 '
+                'with `pomo set <property> <time>`.')
+    return Timeline(durations, cycle, start, position, done)
+
+
+class Commands:
+    """Controls a session from other threads.
+
+    Commands are queued, and the countdown waits on them as it would on key
+    presses. Waiting goes through `clock`, so that a simulated clock moves
+    as it is waited on.
+    """
+
+    def __init__(self, clock):
+        self._queue = queue.SimpleQueue()
+        self._clock = clock
+        # Any clock but the real one only moves when slept on
+        self._real_time = type(clock) is Clock
+
+    def send(self, command):
+        self._queue.put(command)
+
+    def wait(self, timeout):
+        if not self._real_time and timeout is not None:
+            try:
+                return self._queue.get_nowait()
+            except queue.Empty:
+                self._clock.sleep(timeout)
+                timeout = 0
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Session:
+    """A pomodoro session: pomodoros and breaks, following the cycle, until
+    it is stopped.
+
+    `settings` holds the session's properties (see `SESSION_PROPERTIES`);
+    those not given take their default values. Without `settings`, they are
+    read from the configuration, and read again at each phase if it
+    changes.
+
+    The session keeps time with `clock`, draws each phase's countdown with
+    `renderer` (e.g. a `timekeep.ProgressBar`), and announces phases by
+    calling `notifier` with a message. Both are optional. It is controlled
+    through `controls` (e.g. a `controls.Keyboard`), or else through
+    `pause`, `extend`, `skip` and `stop`. After `pomodoros` pomodoros, it
+    ends on its own.
+
+    A session may `record` finished phases in the history (or in
+    `history_dir`), `publish` the running phase for `pomo prompt` and `pomo
+    feed`, and run the configured hook commands and sounds (`run_hooks`).
+    By default, it does all three only if it uses the configuration, as
+    `pomo` does; a session given its `settings` keeps to itself. Only one
+    session at a time should publish.
+    """
+
+    def __init__(self, settings=None, tasks=(), clock=None, renderer=None,
+                 notifier=None, controls=None, pomodoros=None, record=None,
+                 publish=None, run_hooks=None, history_dir=None):
+        self._reload = settings is None
+        if self._reload:
+            with get_configuration() as config:
+                self.settings = session_settings(config)
+            self._config_mtime = get_configuration_mtime()
+        else:
+            self.settings = {**session_settings(get_default_configuration()),
+                             **settings}
+        self._timeline = plan(self.settings)
+        # `_index` is the running phase's, in `_timeline`
+        self._index = 0
+        self.tasks = list(tasks)
+        self.clock = Clock() if clock is None else clock
+        self.ledger = Ledger(self.clock.monotonic, self.clock.time)
+        self._renderer = renderer
+        self._notifier = notifier
+        self._commands = None
+        if controls is None:
+            controls = self._commands = Commands(self.clock)
+        self._controls = controls
+        self._pomodoros = pomodoros
+        self._record = self._reload if record is None else record
+        self._history_dir = history_dir
+        self._publish = self._reload if publish is None else publish
+        self._run_hooks = self._reload if run_hooks is None else run_hooks
+        self._listeners = {event: [] for event in EVENTS}
+        self._background = {event: [] for event in EVENTS}
+        self._status_file = None
+        self._feed = None
+
+    def on(self, event, callback, background=False):
+        """Call `callback(**context)` whenever `event` happens.
+
+        Callbacks are called by the thread running the session, and delay
+        it; keep them short. `background` callbacks run in the hook pool
+        instead, as hook commands do, and are given up on after
+        `hook-timeout` seconds (see `hooks.submit`). Phase events have the
+        pomodoro number and the phase's `duration` as context (and its
+        `kind`, for breaks); the end of a phase also has its `status`,
+        `timekeep.COMPLETED`, `SKIPPED` or `QUIT`. `SETTINGS_CHANGE` has the `property`, its `old` and its
+        `new` value, and `SESSION_END` the session's `ledger`.
+        """
+        if event not in self._listeners:
+            raise PomoError(f'Unknown session event "{event}".')
+        if background:
+            self._background[event].append(callback)
+        else:
+            self._listeners[event].append(callback)
+
+    def _send(self, command):
+        if self._commands is None:
+            raise PomoError('This session has its own controls, and cannot '
+                            'be controlled through its methods.')
+        self._commands.send(command)
+
+    def pause(self):
+        """Pause the running phase, or resume it if it is paused."""
+        self._send(controls.PAUSE)
+
+    def extend(self):
+        """Add five minutes to the running phase."""
+        self._send(controls.EXTEND)
+
+    def skip(self):
+        """End the running phase now, and go on to the next one."""
+        self._send(controls.SKIP)
+
+    def stop(self):
+        """End the running phase and the session."""
+        self._send(controls.QUIT)
+
+    def _emit(self, event, **context):
+        for callback in self._listeners[event]:
+            callback(**context)
+        for callback in self._background[event]:
+            hooks.submit(partial(callback, **context),
+                         timeout=self.settings['hook-timeout'],
+                         name=getattr(callback, '__name__', repr(callback)))
+        if self._run_hooks and event in hooks.EVENTS:
+            hooks.fire(event, self.settings[f'on-{event}'],
+                       self.settings['hook-timeout'], **context)
+
+    def _say(self, text):
+        if self._notifier is not None:
+            self._notifier(text)
+
+    def _play(self, prop):
+        sound = self.settings[prop]
+        if self._run_hooks and sound and os.path.exists(sound):
+            hooks.submit(playsound, sound,
+                         timeout=self.settings['hook-timeout'],
+                         name=f'The sound "{sound}"')
+
+    def _reload_settings(self):
+        # Called at phase boundaries. The file is only read again if its
+        # modification time changed. The rest of the session is planned
+        # again from the phase about to start.
+        if not self._reload:
+            return
+        mtime = get_configuration_mtime()
+        if mtime == self._config_mtime:
+            return
+        timeline, index = self._timeline, self._index
+        try:
+            new_settings = session_settings(read_configuration())
+            new_timeline = timeline.replan(
+                    index, phase_durations(new_settings),
+                    parse_cycle(new_settings['cycle']))
+        except (ValueError, KeyError):
+            # Caught in the middle of a write, or the new settings are not
+            # usable; try again next time
+            return
+        self._config_mtime = mtime
+        old_settings, self.settings = self.settings, new_settings
+        self._timeline, self._index = new_timeline, 0
+        for prop, value in new_settings.items():
+            if value != old_settings[prop]:
+                self._emit(SETTINGS_CHANGE, property=prop,
+                           old=old_settings[prop], new=value)
+
+    def _run_phase(self, phase, duration, start_event, end_event, **context):
+        number = self._timeline.number(self._index)
+        self._emit(start_event, pomodoro=number, duration=duration, **context)
+        self.ledger.begin(phase, duration)
+        if self._status_file is not None:
+            self._status_file.set_phase(phase, number,
+                                        self._timeline.position(self._index))
+            self._feed.set_phase(phase)
+        status = countdown_seconds(duration, keyboard=self._controls,
+                                   ledger=self.ledger, clock=self.clock,
+                                   renderer=self._renderer,
+                                   status=self._status_file, feed=self._feed)
+        self._end_phase(status)
+        self._emit(end_event, pomodoro=number, duration=duration,
+                   status=status, **context)
+        return status
+
+    def _end_phase(self, status):
+        entry = self.ledger.end(status)
+        if entry is None or not self._record:
+            return
+        # Only needed once a phase is recorded, which is not before the
+        # first one ends
+        from internal import history, rollup, sync
+        record = history.record(entry, self.tasks, self._history_dir)
+        rollup.add((record,), self._history_dir)
+        sync_dir = self.settings['sync-dir']
+        if sync_dir:
+            try:
+                sync.publish_record(sync_dir, record)
+            except OSError:
+                # The sync directory is unavailable (e.g. unmounted); the
+                # record is still in the local history
+                pass
+
+    def _loop(self):
+        unicode = supports_unicode()
+        while True:
+            self._reload_settings()
+            phase = self._timeline.kind(self._index)
+            duration = phase_durations(self.settings)[phase]
+            if phase == WORK:
+                number = self._timeline.number(self._index)
+                if self._pomodoros is not None and number > self._pomodoros:
+                    return
+                self._say(f'Pomodoro #{number} starting!')
+                status = self._run_phase(WORK, duration, hooks.POMODORO_START,
+                                         hooks.POMODORO_END)
+                if status == QUIT:
+                    return
+
+                if status == COMPLETED:
+                    if unicode:
+                        checkmarks = '✓'*self._timeline.in_cycle(self._index)
+                        self._say(f'{checkmarks} Done!')
+                    else:
+                        self._say('Done!')
+
+                    self._play('sound')
+            else:
+                length = 'long' if phase == LONG_BREAK else 'short'
+                if unicode:
+                    self._say(f'⏲️ Take a {length} break!')
+                else:
+                    self._say(f'Take a {length} break!')
+                status = self._run_phase(phase, duration, hooks.BREAK_START,
+                                         hooks.BREAK_END, kind=phase)
+
+                if status == COMPLETED:
+                    self._play('break-sound')
+
+                if status == QUIT:
+                    return
+            self._index += 1
+
+    def run(self):
+        """Run the session until it is stopped, or has run its pomodoros.
+
+        A `KeyboardInterrupt` (Ctrl-C) stops it as `stop` does. Returns the
+        session's `Ledger`.
+        """
+        if self._publish:
+            self._status_file = StatusFile()
+            self._feed = Feed()
+        try:
+            self._loop()
+        except KeyboardInterrupt:
+            self._end_phase(QUIT)
+        finally:
+            if self._status_file is not None:
+                self._status_file.close()
+                self._feed.close()
+                self._status_file = self._feed = None
+        self._emit(SESSION_END, ledger=self.ledger)
+        return self.ledger
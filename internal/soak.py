@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""Soak test for the side effects of a long pomo session.
+
+Runs one long session, on a virtual clock, through the same `Session` the
+command line uses: its countdowns, ledger, status file, feed, history,
+rollups, notifications, hooks and sounds. Only the waiting is skipped.
+Everything it writes goes to a temporary directory. Meanwhile, the
+process's RSS, live threads, open file descriptors and child processes
+are sampled. Fails if any of them keeps growing.
+
+Usage:
+    soak.py [--cycles=<n>] [--interval=<seconds>] [--hook=<command>]
+            [--sound=<file>] [--samples=<n>]
+    soak.py --help
+
+Options:
+    -h --help               Show this screen.
+    --cycles=<n>            Number of pomodoro cycles to run [default: 500].
+    --interval=<seconds>    Real time to wait at each transition, for hooks
+                            and sounds to run [default: 0.005].
+    --hook=<command>        Hook command run at every transition
+                            [default: true].
+    --sound=<file>          Sound played at the end of every phase
+                            (defaults to the bundled pomodoro sound).
+    --samples=<n>           Number of resource samples to take
+                            [default: 40].
+
+Run it from the repository root with `python3 -m internal.soak`.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from internal import hooks
+from internal.clock import VirtualClock
+from internal.config import get_internal_path
+from internal.docopt import docopt
+from internal.notify import notification
+from internal.session import Session
+from internal.timeline import DEFAULT_CYCLE
+
+# How much each resource may exceed its early maximum by the end of the run,
+# to allow for work that is legitimately in flight when it is sampled.
+_ALLOWANCES = {
+    'rss_kib': 8192,
+    'threads': 0,
+    'fds': 4,
+    'children': 4,
+}
+
+
+def _rss_kib():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def _children():
+    count = 0
+    for task in os.listdir('/proc/self/task'):
+        try:
+            with open(f'/proc/self/task/{task}/children') as children:
+                count += len(children.read().split())
+        except OSError:
+            pass
+    return count
+
+
+def sample():
+    return {
+        'rss_kib': _rss_kib(),
+        'threads': threading.active_count(),
+        'fds': len(os.listdir('/proc/self/fd')),
+        'children': _children(),
+    }
+
+
+def _settings(hook, sound):
+    # Phases last a few (virtual) seconds, so that each countdown still
+    # goes through a few frames
+    settings = {'pomodoro': 4, 'short': 1, 'long': 2, 'cycle': DEFAULT_CYCLE,
+                'sound': sound, 'break-sound': sound, 'hook-timeout': 5}
+    settings.update((f'on-{event}', hook) for event in hooks.EVENTS)
+    return settings
+
+
+def _drain(fd):
+    try:
+        while os.read(fd, 65536):
+            pass
+    except BlockingIOError:
+        pass
+
+
+def soak(cycles, interval, hook, sound, samples):
+    pomodoros = cycles*DEFAULT_CYCLE.split().count('work')
+    every = max(1, pomodoros // samples)
+    history = []
+
+    def pace(**context):
+        time.sleep(interval)
+
+    def take_sample(pomodoro, **context):
+        if pomodoro % every == 0:
+            _drain(feed)
+            history.append(sample())
+            print(f'{pomodoro:>8} ' + ' '.join(
+                f'{key}={value}' for key, value in history[-1].items()))
+
+    with tempfile.TemporaryDirectory(prefix='pomo-soak-') as directory:
+        # The status file and feed are made in $XDG_RUNTIME_DIR
+        os.environ['XDG_RUNTIME_DIR'] = directory
+        os.mkfifo(os.path.join(directory, 'pomo.feed'))
+        feed = os.open(os.path.join(directory, 'pomo.feed'),
+                       os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            session = Session(_settings(hook, sound), tasks=('soak',),
+                              clock=VirtualClock(), notifier=notification,
+                              pomodoros=pomodoros, record=True,
+                              publish=True, run_hooks=True,
+                              history_dir=os.path.join(directory, 'history'))
+            for event in hooks.EVENTS:
+                session.on(event, pace)
+            session.on(hooks.POMODORO_END, take_sample)
+            session.run()
+        finally:
+            os.close(feed)
+    for problem in hooks.problems():
+        print(f'Hook problem: {problem}')
+    return history
+
+
+def growth(history):
+    """Compare the start of the run (after a warm-up) with its end.
+
+    Returns the resources whose maximum over the last quarter of samples
+    exceeds the maximum over the first quarter by more than is allowed.
+    """
+    quarter = max(1, len(history) // 4)
+    early = history[1:1 + quarter] or history[:1]
+    late = history[-quarter:]
+    grown = {}
+    for key, allowance in _ALLOWANCES.items():
+        before = max(entry[key] for entry in early)
+        after = max(entry[key] for entry in late)
+        if after > before + allowance:
+            grown[key] = (before, after)
+    return grown
+
+
+if __name__ == '__main__':
+    args = docopt(__doc__)
+    sound = args['--sound']
+    if sound is None:
+        sound = os.path.join(get_internal_path(), 'pomodoro.wav')
+    history = soak(int(args['--cycles']), float(args['--interval']),
+                   args['--hook'], sound, int(args['--samples']))
+    grown = growth(history)
+    if grown:
+        for key, (before, after) in grown.items():
+            print(f'FAIL: {key} grew from {before} to {after}.')
+        sys.exit(1)
+    print('OK: no resource grew over the run.')
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+# This module is imported by `pomo prompt`, which runs on every shell prompt;
+# keep its imports light.
+import mmap
+import os
+import struct
+import sys
+import time
+
+# Record layout: magic, layout version, phase, flags, position of the phase
+# in the cycle, pomodoro number, session pid, sequence number, phase
+# deadline (wall clock) and seconds remaining when paused.
+_FORMAT = struct.Struct('<4sBBBBIIIdd')
+_MAGIC = b'POMO'
+_VERSION = 1
+_PAUSED = 1
+_SEQUENCE = struct.Struct('<I')
+_SEQUENCE_OFFSET = 16
+
+IDLE = 0
+WORK = 1
+SHORT_BREAK = 2
+LONG_BREAK = 3
+
+_PHASES = {'work': WORK, 'short': SHORT_BREAK, 'long': LONG_BREAK}
+_PROMPT_LABELS = {WORK: '🍅', SHORT_BREAK: '☕', LONG_BREAK: '☕'}
+_PROMPT_LABELS_ALT = {WORK: 'W', SHORT_BREAK: 'B', LONG_BREAK: 'B'}
+
+
+def status_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'pomo.status')
+    return os.path.join('/tmp', f'pomo-{os.getuid()}.status')
+
+
+class StatusFile:
+    """The running session's status, kept in a small memory-mapped file.
+
+    The record has a fixed layout, and is only written when the phase or its
+    deadline changes. Readers compute the remaining time from the deadline
+    themselves. Each write bumps a sequence number to an odd value before,
+    and an even value after, so that readers can detect a torn read.
+    """
+
+    def __init__(self, path=None):
+        self.path = status_path() if path is None else path
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            os.ftruncate(fd, _FORMAT.size)
+            self._map = mmap.mmap(fd, _FORMAT.size)
+        finally:
+            os.close(fd)
+        self._phase = IDLE
+        self._position = 0
+        self._number = 0
+        self._sequence = 0
+        self._write(0., 0., False)
+
+    def _write(self, deadline, remaining, paused):
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._map, _SEQUENCE_OFFSET, self._sequence)
+        self._map[:] = _FORMAT.pack(
+                _MAGIC, _VERSION, self._phase, _PAUSED if paused else 0,
+                self._position, self._number, os.getpid(), self._sequence, deadline, remaining)
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._map, _SEQUENCE_OFFSET, self._sequence)
+
+    def set_phase(self, phase, number, position=0):
+        """Record that phase `phase` ('work', 'short' or 'long') of pomodoro
+        #`number` started, at `position` in the cycle."""
+        self._phase = phase_code(phase)
+        self._number = number
+        # Cycles are short; the record has a byte for the position
+        self._position = position if position < 256 else 0
+
+    def set_remaining(self, remaining, paused):
+        self._write(time.time() + remaining, remaining, paused)
+
+    def close(self):
+        self._map.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def read_status(path=None):
+    """Read the running session's status.
+
+    Returns `(phase, number, remaining, paused, position)`, or None if no
+    session is running.
+    """
+    try:
+        with open(status_path() if path is None else path, 'rb') as file:
+            status_map = mmap.mmap(file.fileno(), _FORMAT.size,
+                                   access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    with status_map:
+        for _ in range(8):
+            before = _SEQUENCE.unpack_from(status_map, _SEQUENCE_OFFSET)[0]
+            record = status_map[:]
+            after = _SEQUENCE.unpack_from(status_map, _SEQUENCE_OFFSET)[0]
+            if before == after and before % 2 == 0:
+                break
+        else:
+            return None
+    magic, version, phase, flags, position, number, pid, _, deadline, \
+            remaining = _FORMAT.unpack(record)
+    if magic != _MAGIC or version != _VERSION or phase == IDLE:
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        # The session died without cleaning up
+        return None
+    except PermissionError:
+        pass
+    paused = bool(flags & _PAUSED)
+    if not paused:
+        remaining = max(0., deadline - time.time())
+    return phase, number, remaining, paused, position
+
+
+def phase_code(phase):
+    return _PHASES[phase]
+
+
+def phase_name(code):
+    """The phase ('work', 'short' or 'long') with code `code`."""
+    for phase, phase_code_ in _PHASES.items():
+        if phase_code_ == code:
+            return phase
+    raise KeyError(code)
+
+
+def format_segment(phase, remaining, paused, encoding):
+    """A short text with the phase (as a code) and the time left, such as
+    "🍅 12:34", using only characters the `encoding` supports."""
+    try:
+        label = _PROMPT_LABELS[phase]
+        label.encode(encoding or 'ascii')
+    except (UnicodeEncodeError, LookupError):
+        label = _PROMPT_LABELS_ALT[phase]
+    minutes, seconds = divmod(int(remaining + .5), 60)
+    pause_mark = ' (paused)' if paused else ''
+    return f'{label} {minutes:02}:{seconds:02}{pause_mark}'
+
+
+def print_prompt():
+    """Print a short prompt segment with the current phase and time left.
+
+    Prints nothing if no session is running.
+    """
+    status = read_status()
+    if status is None:
+        return 0
+    phase, number, remaining, paused, _ = status
+    sys.stdout.write(format_segment(phase, remaining, paused,
+                                    sys.stdout.encoding) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    # Running this file directly skips compiling pomo.py, which (as a
+    # script) is never bytecode-cached.
+    sys.exit(print_prompt())
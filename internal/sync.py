@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import json
+import os
+import time
+
+from internal import history, rollup
+from internal.history import host_name, new_id
+
+# Layout of the sync directory, shared between machines (e.g. through
+# Syncthing or NFS). Each machine only ever appends to its own logs:
+#
+#   <sync-dir>/<host>/history/YYYY-MM.jsonl    finished phases
+#   <sync-dir>/<host>/config.jsonl             configuration changes
+#
+# Each machine merges the other machines' logs into its local history,
+# remembering how far into each log it has read, so that a merge only reads
+# the records appended since the last one.
+_CONFIG_LOG = 'config.jsonl'
+_STATE = 'sync.json'
+# Held while merging, so that two processes (say, a session starting and
+# `pomo stats`) don't both merge the same new records
+_LOCK = 'sync.lock'
+
+# Properties holding paths are specific to each machine, and not synced.
+_SYNCED_TYPES = ('time', 'cmd', 'cycle')
+
+
+def _append_line(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as log:
+        log.write(json.dumps(data) + '\n')
+
+
+def publish_record(sync_dir, record, host=None):
+    """Append a history record to this machine's log in `sync_dir`."""
+    host = host_name() if host is None else host
+    _append_line(os.path.join(sync_dir, host, 'history',
+                              history.shard_name(record['start'])), record)
+
+
+def publish_config(sync_dir, prop, value, host=None):
+    """Append a configuration change to this machine's log in `sync_dir`.
+
+    Returns the change's stamp, which orders it against changes made on
+    other machines.
+    """
+    host = host_name() if host is None else host
+    change = {'time': time.time(), 'host': host, 'id': new_id(),
+              'property': prop, 'value': value}
+    _append_line(os.path.join(sync_dir, host, _CONFIG_LOG), change)
+    return change_stamp(change)
+
+
+def change_stamp(change):
+    # Changes are ordered by time, and then by host and id, so that every
+    # machine settles on the same value even if two changes carry the same
+    # time, or the machines' clocks disagree.
+    return [change['time'], change['host'], change['id']]
+
+
+def is_synced(prop_config):
+    return prop_config['type'].startswith(_SYNCED_TYPES)
+
+
+def _read_new(path, offset):
+    """The complete lines appended to `path` since `offset`.
+
+    Returns `(lines, new_offset, restarted)`. If the file is now shorter
+    than `offset`, it was replaced, and is read again from the start.
+    """
+    size = os.path.getsize(path)
+    restarted = size < offset
+    if restarted:
+        offset = 0
+    with open(path, 'rb') as log:
+        log.seek(offset)
+        data = log.read(size - offset)
+    # A line without its newline is still being written (or synced)
+    end = data.rfind(b'\n') + 1
+    return data[:end].splitlines(), offset + end, restarted
+
+
+def _parse(lines):
+    for line in lines:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            pass
+
+
+def merge(sync_dir, history_dir=None, host=None):
+    """Merge other machines' new records from `sync_dir`.
+
+    New history records are appended to the local history in
+    `history_dir`; a record whose id was already merged is skipped.
+    Returns `(records, config_changes)`, the number of records merged and
+    the new configuration changes, oldest first.
+    """
+    host = host_name() if host is None else host
+    history_dir = history.history_path() if history_dir is None \
+            else history_dir
+    with history.locked(_LOCK, history_dir):
+        return _merge(sync_dir, history_dir, host)
+
+
+def _merge(sync_dir, history_dir, host):
+    state_path = os.path.join(history_dir, _STATE)
+    try:
+        with open(state_path, 'r') as state_file:
+            state = json.load(state_file)
+    except (OSError, ValueError):
+        state = {}
+
+    known_ids = None
+    merged = 0
+    changes = []
+    others = sorted(name for name in os.listdir(sync_dir)
+                    if name != host
+                    and os.path.isdir(os.path.join(sync_dir, name)))
+    for other in others:
+        history_logs = os.path.join(sync_dir, other, 'history')
+        names = sorted(os.listdir(history_logs)) \
+                if os.path.isdir(history_logs) else []
+        for name in names:
+            key = f'{other}/history/{name}'
+            first_read = key not in state
+            lines, state[key], restarted = _read_new(
+                    os.path.join(history_logs, name), state.get(key, 0))
+            if not lines:
+                continue
+            # A log read from the start may hold records that were merged
+            # before (e.g. if it was replaced, or the merge state was lost)
+            if known_ids is None and (restarted or first_read):
+                known_ids = history.known_ids(history_dir)
+            records = []
+            for record in _parse(lines):
+                if known_ids is not None:
+                    if record.get('id') in known_ids:
+                        continue
+                    known_ids.add(record.get('id'))
+                records.append(record)
+            history.append(records, history_dir)
+            rollup.add(records, history_dir)
+            merged += len(records)
+
+        config_log = os.path.join(sync_dir, other, _CONFIG_LOG)
+        if os.path.exists(config_log):
+            key = f'{other}/{_CONFIG_LOG}'
+            lines, state[key], _ = _read_new(config_log, state.get(key, 0))
+            changes.extend(_parse(lines))
+
+    temp_path = f'{state_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as state_file:
+        json.dump(state, state_file)
+    os.replace(temp_path, state_path)
+    changes.sort(key=change_stamp)
+    return merged, changes
+
+
+def apply_config_changes(config, changes):
+    """Apply configuration changes from other machines to `config`.
+
+    Each synced property keeps the stamp of the change that last set it,
+    and only takes a change with a later stamp. Returns the properties that
+    changed.
+    """
+    changed = []
+    for change in changes:
+        prop_config = config['config'].get(change.get('property'))
+        if prop_config is None or not is_synced(prop_config):
+            continue
+        stamp = change_stamp(change)
+        if prop_config.get('changed') is None \
+                or stamp > prop_config['changed']:
+            prop_config['value'] = change['value']
+            prop_config['changed'] = stamp
+            changed.append(change['property'])
+    return changed
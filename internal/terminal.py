@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import os
+import shutil
+import signal
+import sys
+
+# Every non-ASCII glyph pomo may print. If the terminal can encode all of
+# them, the Unicode output is used for the whole session.
+_PROBE_GLYPHS = '█▆▄▁✓⏲️→'
+
+_encoding = None
+_unicode = None
+_columns = None
+_layout_generation = 0
+
+
+def encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = getattr(sys.stdout, 'encoding', None) or 'ascii'
+    return _encoding
+
+
+def supports_unicode():
+    """Whether stdout can encode pomo's Unicode glyphs.
+
+    This is decided once, the first time it is asked, and cached for the
+    rest of the session.
+    """
+    global _unicode
+    if _unicode is None:
+        try:
+            _PROBE_GLYPHS.encode(encoding())
+            _unicode = True
+        except (UnicodeEncodeError, LookupError):
+            _unicode = False
+    return _unicode
+
+
+def encode(text):
+    return text.encode(encoding(), errors='replace')
+
+
+def flush():
+    """Flush anything `print` has buffered, so that raw writes that follow
+    come out in order."""
+    sys.stdout.flush()
+
+
+def write(frame):
+    """Write an already encoded frame to stdout.
+
+    A frame is written with a single `os.write` call; only if the kernel
+    accepts part of it is the rest written afterwards.
+    """
+    fd = sys.stdout.fileno()
+    written = os.write(fd, frame)
+    while written < len(frame):
+        written += os.write(fd, frame[written:])
+
+
+def _on_resize(signum, frame):
+    global _columns, _layout_generation
+    new_columns = shutil.get_terminal_size().columns
+    if new_columns != _columns:
+        _columns = new_columns
+        _layout_generation += 1
+
+
+def columns():
+    """The width of the terminal, in characters.
+
+    The width is queried once; afterwards it is only updated by a SIGWINCH
+    handler, when the window is actually resized.
+    """
+    global _columns
+    if _columns is None:
+        _columns = shutil.get_terminal_size().columns
+        if hasattr(signal, 'SIGWINCH'):
+            try:
+                signal.signal(signal.SIGWINCH, _on_resize)
+            except ValueError:
+                # Not in the main thread; the width will not follow resizes.
+                pass
+    return _columns
+
+
+def layout_generation():
+    """A counter that changes every time the terminal is resized.
+
+    Callers that cache anything depending on `columns()` keep the generation
+    they built it for, and rebuild when it no longer matches.
+    """
+    return _layout_generation
+
+
+def clear_line():
+    """Encoded bytes that move to the start of the line and blank it."""
+    if sys.stdout.isatty():
+        return b'\r\x1b[2K'
+    return b'\r'
@@ -1,68 +1,193 @@
 #!/usr/bin/env python3
 # -*- encoding: utf-8 -*-
 
-from time import sleep
-
-_START_CHAR = '['
-_START_CHAR_ALT = '['
-_FULL_CHAR = '█'
-_FULL_CHAR_ALT = '*'
-_THREE_CHAR = '▆'
-_THREE_CHAR_ALT = '+'
-_TWO_CHAR = '▄'
-_TWO_CHAR_ALT = '-'
-_ONE_CHAR = '▁'
-_ONE_CHAR_ALT = '.'
-_EMPTY_CHAR = ' '
-_EMPTY_CHAR_ALT = ' '
-_END_CHAR = ']'
-_END_CHAR_ALT = ']'
-
-
-def _build_bar(fill, width, start_char, full_char, three_char, two_char,
-        one_char, empty_char, end_char):
-    full_count = int(fill*(width-2))
-    remainder = (fill*(width-2))%1. 
+from math import ceil
+
+from internal import controls, terminal
+from internal.clock import Clock
+
+# Glyphs, in order: start, full, three quarters, half, one quarter, empty, end
+_GLYPHS = ('[', '█', '▆', '▄', '▁', ' ', ']')
+_GLYPHS_ALT = ('[', '*', '+', '-', '.', ' ', ']')
+
+
+def _build_bar(quarters, width, glyphs):
+    start_char, full_char, three_char, two_char, one_char, empty_char, \
+            end_char = glyphs
+    full_count, remainder = divmod(quarters, 4)
 
     remainder_char = ''
-    if remainder > 0.:
-        if remainder < .25:
-            remainder_char = empty_char
-        elif remainder < .5:
-            remainder_char = one_char
-        elif remainder < .75:
-            remainder_char = two_char
-        elif remainder < 1.:
-            remainder_char = three_char
-
-    total_count = full_count if remainder == 0. else full_count + 1
+    if remainder > 0:
+        remainder_char = (one_char, two_char, three_char)[remainder - 1]
+
+    total_count = full_count if remainder == 0 else full_count + 1
     return start_char + full_count*full_char + remainder_char + \
             (width-2-total_count)*empty_char + end_char
 
 
-def countdown_seconds(time, width=50, update_freq=8):
-    last_width = 0
-    for moment in range((time*update_freq)+1):
-        second = moment/update_freq
-        fill = 1. - second/time
-        unicode_str = _build_bar(fill, width, _START_CHAR, _FULL_CHAR,
-                        _THREE_CHAR, _TWO_CHAR, _ONE_CHAR, _EMPTY_CHAR,
-                        _END_CHAR)
-        unit_str = 'seconds' if int(second) > 1 else 'second'
-        explicit_time = f' [{time - int(second)} {unit_str} left]'
-        end = '\n' if int(second) == time else '\r'
+COMPLETED = 'completed'
+SKIPPED = 'skipped'
+QUIT = 'quit'
+
+# Seconds added to the running phase by the "extend" control
+_EXTENSION = 300
+
+_CLOCK = Clock()
+
+
+def _bar_width(text_width):
+    # Leave the last column free, so that the cursor never wraps.
+    width = terminal.columns() - 1 - text_width
+    return width if width >= 3 else 0
+
+
+def _time_text(remaining, paused):
+    seconds = ceil(remaining)
+    unit_str = 'second' if seconds == 1 else 'seconds'
+    if paused:
+        return f' [{seconds} {unit_str} left, paused]'
+    return f' [{seconds} {unit_str} left]'
+
+
+class ProgressBar:
+    """Draws a countdown as a progress bar, on one terminal line that is
+    redrawn in place.
+
+    The bar fills the terminal's width (or `width` columns), and is laid out
+    again when the terminal is resized.
+    """
+
+    def __init__(self, width=None):
+        self._fixed_width = width
+        self._total = None
+
+    def _layout(self):
+        if self._fixed_width is None:
+            self._width = _bar_width(self._text_width)
+        else:
+            self._width = self._fixed_width
+        # Bars only change in quarter-cell steps, so each distinct bar is
+        # built and encoded once and then reused for every frame that shows
+        # it.
+        self._bars = {}
+
+    def frame(self, remaining, paused, total, done):
+        """Draw the countdown with `remaining` of `total` seconds left. The
+        line is finished once the countdown is `done`."""
+        if self._total is None:
+            # A new countdown
+            self._glyphs = _GLYPHS if terminal.supports_unicode() \
+                    else _GLYPHS_ALT
+            self._generation = terminal.layout_generation()
+            self._last_width = 0
+            self._prefix = b''
+            terminal.flush()
+        if total != self._total:
+            self._total = total
+            self._text_width = len(_time_text(total, True))
+            self._layout()
+        elif self._fixed_width is None \
+                and self._generation != terminal.layout_generation():
+            self._generation = terminal.layout_generation()
+            self._layout()
+            self._last_width = 0
+            self._prefix = terminal.clear_line()
+
+        width = self._width
+        fill = remaining/total if total else 0.
+        quarters = int(fill*(width-2)*4) if width else 0
+        bar = self._bars.get(quarters)
+        if bar is None:
+            bar = self._bars[quarters] = terminal.encode(
+                    _build_bar(quarters, width, self._glyphs) if width else '')
+        time_text = _time_text(remaining, paused)
+        end = '\n' if done else '\r'
+
+        line_width = width + len(time_text)
+        padding = ' '*max(0, self._last_width - line_width)
+        terminal.write(self._prefix + bar +
+                       terminal.encode(time_text + padding + end))
+        self._prefix = b''
+        self._last_width = line_width
+        if done:
+            self._total = None
+
+
+def countdown_seconds(time, update_freq=8, keyboard=None, ledger=None,
+                      clock=None, renderer=None, status=None, feed=None):
+    """Count down `time` seconds.
+
+    Time is read from, and waited on, the given `clock`. Each frame is
+    drawn by the `renderer` (such as a `ProgressBar`), `update_freq` times
+    a second; without one, and without a `feed`, the countdown waits for
+    its deadline in one go.
+
+    If a `keyboard` is given, the countdown can be controlled with it (or
+    with anything else that `wait`s for commands). Commands and the next
+    frame's deadline are waited on together, so the loop only wakes up when
+    there is something to do. Time spent paused does not count towards the
+    phase, and is reported to the `ledger`. Changes to the deadline are
+    published to the `status` file, and changes to the time shown to the
+    `feed`.
+
+    A `KeyboardInterrupt` while waiting quits, as the quit command does.
+    Returns `COMPLETED`, `SKIPPED` or `QUIT`.
+    """
+    if clock is None:
+        clock = _CLOCK
+    total = time
+    deadline = clock.monotonic() + total
+    paused_at = None
+    result = COMPLETED
+    if status is not None:
+        status.set_remaining(total, False)
+
+    while True:
+        paused = paused_at is not None
+        remaining = max(0., deadline - (paused_at if paused else clock.monotonic()))
+        done = remaining == 0. or result != COMPLETED
+        if renderer is not None:
+            renderer.frame(remaining, paused, total, done)
+        if feed is not None:
+            feed.update(remaining, paused)
+        if done:
+            return result
 
+        if paused:
+            timeout = None
+        elif renderer is None and feed is None:
+            # Nothing is shown in between
+            timeout = remaining
+        else:
+            timeout = min(1/update_freq, remaining)
         try:
-            final_str = unicode_str + explicit_time
-            print(final_str.ljust(last_width), end=end)
-        except UnicodeEncodeError:
-            ascii_str = _build_bar(fill, width, _START_CHAR_ALT, _FULL_CHAR_ALT,
-                            _THREE_CHAR_ALT, _TWO_CHAR_ALT, _ONE_CHAR_ALT,
-                            _EMPTY_CHAR_ALT, _END_CHAR_ALT)
-            final_str = ascii_str + explicit_time
-            print(final_str.ljust(last_width), end=end)
-        last_width = len(final_str)
-        sleep(1/update_freq)
+            if keyboard is None:
+                clock.sleep(timeout)
+                continue
+            command = keyboard.wait(timeout)
+        except KeyboardInterrupt:
+            command = controls.QUIT
+        if command == controls.PAUSE:
+            if paused:
+                deadline += clock.monotonic() - paused_at
+                paused_at = None
+                if ledger is not None:
+                    ledger.resume()
+            else:
+                paused_at = clock.monotonic()
+                if ledger is not None:
+                    ledger.pause()
+            if status is not None:
+                status.set_remaining(remaining, not paused)
+        elif command == controls.EXTEND:
+            deadline += _EXTENSION
+            total += _EXTENSION
+            if status is not None:
+                status.set_remaining(remaining + _EXTENSION, paused)
+        elif command == controls.SKIP:
+            result = SKIPPED
+        elif command == controls.QUIT:
+            result = QUIT
 
 
 def human_time_interval(sec_elapsed):
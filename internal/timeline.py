@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+from bisect import bisect_right
+
+from internal.ledger import PHASES, WORK
+
+DEFAULT_CYCLE = 'work short work short work short work long'
+
+
+def parse_cycle(text):
+    """The phases of a cycle written as phase names separated by spaces,
+    such as "work short work long".
+
+    Raises `ValueError` if a name is not a phase, or there is no work
+    phase.
+    """
+    cycle = tuple(text.split())
+    for phase in cycle:
+        if phase not in PHASES:
+            raise ValueError(f'"{phase}" is not a phase. Expected one of '
+                             + ', '.join(f'"{name}"' for name in PHASES)
+                             + '.')
+    if WORK not in cycle:
+        raise ValueError('A cycle needs at least one "work" phase.')
+    return cycle
+
+
+class Timeline:
+    """The schedule of a session: the phases of a cycle, repeated forever,
+    and when each of them starts.
+
+    Phases are numbered from 0. Their start times are kept as cumulative
+    boundaries, so the phase at any time is found by bisection. Phases are
+    only laid out as far as has been asked for.
+
+    `durations` holds the length of each phase, in seconds. The timeline
+    starts at `start`, with the phase at `position` in the cycle, after
+    `done` pomodoros.
+    """
+
+    def __init__(self, durations, cycle=parse_cycle(DEFAULT_CYCLE), start=0.,
+                 position=0, done=0):
+        if not sum(durations[phase] for phase in cycle) > 0:
+            raise ValueError('A cycle must take some time.')
+        self._durations = durations
+        self._cycle = tuple(cycle)
+        self._position = position % len(self._cycle)
+        # The number of pomodoros up to each position of the cycle, for the
+        # checkmarks shown after each one
+        self._in_cycle = []
+        for phase in self._cycle:
+            self._in_cycle.append((self._in_cycle[-1] if self._in_cycle else 0)
+                                  + (phase == WORK))
+        # _starts has one more entry than _numbers: the end of the last
+        # phase laid out
+        self._starts = [start]
+        self._numbers = []
+        self._done = done
+
+    def _extend(self):
+        phase = self.kind(len(self._numbers))
+        if phase == WORK:
+            self._done += 1
+        # A break belongs to the pomodoro before it
+        self._numbers.append(max(self._done, 1))
+        self._starts.append(self._starts[-1] + self._durations[phase])
+
+    def _ensure(self, index):
+        while len(self._numbers) <= index:
+            self._extend()
+
+    def position(self, index):
+        """The position of phase `index` in the cycle."""
+        return (self._position + index) % len(self._cycle)
+
+    def kind(self, index):
+        return self._cycle[self.position(index)]
+
+    def number(self, index):
+        """The number of the pomodoro phase `index` is, or follows."""
+        self._ensure(index)
+        return self._numbers[index]
+
+    def done_before(self, index):
+        """The number of pomodoros before phase `index`."""
+        return self.number(index) - (self.kind(index) == WORK)
+
+    def in_cycle(self, index):
+        """The number of pomodoros in the cycle so far, including phase
+        `index`."""
+        return self._in_cycle[self.position(index)]
+
+    def start(self, index):
+        self._ensure(index)
+        return self._starts[index]
+
+    def end(self, index):
+        self._ensure(index)
+        return self._starts[index + 1]
+
+    def index_at(self, moment):
+        """The phase running at `moment`."""
+        if moment < self._starts[0]:
+            raise ValueError('The timeline starts later.')
+        while self._starts[-1] <= moment:
+            self._extend()
+        return bisect_right(self._starts, moment) - 1
+
+    def next_index(self, kind, moment):
+        """The first phase of kind `kind` that starts at or after `moment`,
+        or None if the cycle has none."""
+        if kind not in self._cycle:
+            return None
+        index = self.index_at(moment)
+        if self.start(index) < moment:
+            index += 1
+        while self.kind(index) != kind:
+            index += 1
+        return index
+
+    def replan(self, index, durations, cycle):
+        """A timeline that continues this one from phase `index`, with new
+        durations and cycle."""
+        return Timeline(durations, cycle, self.start(index),
+                        self.position(index), self.done_before(index))
+
@@ -5,6 +5,17 @@
 Usage:
     pomo
     pomo timer
+    pomo prompt
+    pomo feed
+    pomo stats [--since=<date>] [--until=<date>]
+    pomo stats (today | week | weeks | tasks)
+    pomo stats --rebuild
+    pomo schedule [--at=<time>]
+    pomo sync
+    pomo report --merge <directory>... [--format=<format>]
+                [--since=<date>] [--until=<date>]
+    pomo export [--format=<format>] [--since=<date>] [--until=<date>]
+    pomo --simulate=<pomodoros>
     pomo list
     pomo set <property> <value>
     pomo reset <property>
@@ -15,19 +26,48 @@ Usage:
 Options:
     -h --help               Show this screen
     --man                   Show the README.
+    --simulate=<pomodoros>  Run <pomodoros> pomodoros on a virtual clock,
+                            without waiting, and print the schedule.
+    --since=<date>          First day (YYYY-MM-DD) to include in statistics.
+    --until=<date>          Last day (YYYY-MM-DD) to include in statistics.
+    --rebuild               Rebuild the statistics from the history.
+    --at=<time>             A time of day (HH:MM) to show the phase of.
+    --format=<format>       Format of a report (csv or json) or an export
+                            (csv or jsonl) [default: csv].
     --version               Display this program's version.
 """
 
+import sys
+
+# `pomo prompt` runs on every shell prompt, so it is answered before any of
+# the heavier imports below.
+if __name__ == '__main__' and sys.argv[1:] == ['prompt']:
+    from internal.status import print_prompt
+    sys.exit(print_prompt())
+
 import re
-import time
 import os
-import threading
+import time
 from internal.docopt import docopt
-from internal.playsound import playsound
 from internal.config import get_configuration, get_default_configuration
-from internal.timekeep import countdown_seconds, human_time_interval
-from internal.editor import get_input_from_editor
+from internal.timekeep import human_time_interval, ProgressBar
+from internal.editor import get_input_from_editor, get_tasks_from_terminal, \
+        BUILTIN
 from internal.notify import notify_and_print
+from internal.terminal import supports_unicode
+# The modules of the other subcommands (export, report, rollup, sync) are
+# imported by the functions that use them, so as not to slow down starting
+# a session
+from internal import controls, hooks
+from internal.controls import Keyboard
+from internal.clock import VirtualClock
+from internal.status import read_status, phase_name
+from internal.timeline import parse_cycle
+from internal.feed import follow
+from internal.ledger import WORK, SHORT_BREAK, LONG_BREAK, PAUSE, OVERRUN
+# The library API, for use from other Python programs
+from internal.errors import PomoError, ConfigurationError
+from internal.session import Session, SETTINGS_CHANGE, plan, session_settings
 
 
 TIME_INTERVAL_RE = re.compile(
@@ -35,14 +75,15 @@ TIME_INTERVAL_RE = re.compile(
 
 
 def _print_readme():
-    readme_path = os.path.join(
-            os.path.dirname(os.path.realpath(__file__)),
-            'README.md')
-    if not os.path.exists(readme_path):
+    # Read through the module's loader, so that the README is also found
+    # when pomo runs from a zipapp.
+    readme_path = os.path.join(os.path.dirname(__file__), 'README.md')
+    try:
+        readme = __loader__.get_data(readme_path)
+    except OSError:
         print('README not found.')
         exit(1)
-    with open(readme_path, 'r') as readme_file:
-        print(readme_file.read())
+    print(readme.decode('utf-8'))
 
 
 def _list_properties():
@@ -93,7 +134,9 @@ def _edit_mode(arguments):
                     elif unit.startswith('h'):
                         new_value *= 3600
                 new_value = int(new_value)
-            elif type_.startswith('exe'):
+            elif type_.startswith('editor') and new_value == BUILTIN:
+                pass
+            elif type_.startswith(('exe', 'editor')):
                 new_value = os.path.realpath(new_value)
                 if not os.path.exists(new_value):
                     print(f'"{prop}" is expected to point to an executable, '
@@ -112,12 +155,31 @@ def _edit_mode(arguments):
                           f'but "{new_value}" does not exist.')
                     warn_if_optional()
                     exit(1)
+            elif type_.startswith('dir'):
+                new_value = os.path.realpath(new_value)
+                if not os.path.isdir(new_value):
+                    print(f'"{prop}" is expected to point to a directory, '
+                          f'but "{new_value}" is not a directory.')
+                    warn_if_optional()
+                    exit(1)
+            elif type_.startswith('cycle'):
+                try:
+                    new_value = ' '.join(parse_cycle(new_value))
+                except ValueError as error:
+                    print(f'"{prop}" is expected to be a cycle of phases, '
+                          f'but "{new_value}" is not: {error}')
+                    warn_if_optional()
+                    exit(1)
+            elif type_.startswith('cmd'):
+                # Shell commands are run as given
+                pass
             else:
                 raise Exception(f'Type "{type_}" not implemented!')
         
         # Set the value
         prev_value = config['config'][prop]['value']
         config['config'][prop]['value'] = new_value
+        _publish_change(config, prop)
         
         # User feedback
         try:
@@ -138,6 +200,7 @@ def _reset_mode(args):
         old_value = config['config'][to_reset]['value']
         new_value = default_config['config'][to_reset]['value']
         config['config'][to_reset]['value'] = new_value
+        _publish_change(config, to_reset)
 
     # User feedback
     try:
@@ -146,128 +209,352 @@ def _reset_mode(args):
         print(f'"{to_reset}": "{old_value}" -> "{new_value}"')
 
 
-def _run(with_tasks):
+def _publish_change(config, prop):
+    # Share the change with other machines, through the sync directory
+    sync_dir = config['config']['sync-dir']['value']
+    if not sync_dir:
+        return
+    from internal import sync
+    if sync.is_synced(config['config'][prop]):
+        config['config'][prop]['changed'] = sync.publish_config(
+                sync_dir, prop, config['config'][prop]['value'])
+
+
+def _sync(verbose, file=None):
+    """Merge the other machines' history and configuration changes from
+    the sync directory, if one is set.
+
+    Messages go to `file` (stdout by default).
+    """
+    with get_configuration() as config:
+        sync_dir = config['config']['sync-dir']['value']
+        if not sync_dir:
+            if verbose:
+                print('No sync directory is set. Set one with '
+                      '`pomo set sync-dir <directory>`.', file=file)
+            return
+        if not os.path.isdir(sync_dir):
+            print(f'Warning: sync directory "{sync_dir}" is not available.', file=file)
+            return
+        from internal import sync
+        records, changes = sync.merge(sync_dir)
+        changed = sync.apply_config_changes(config, changes)
+    if verbose or records:
+        print(f'Merged {records} records from other machines.', file=file)
+    for prop in changed:
+        print(f'"{prop}" was changed on another machine.', file=file)
+
+
+def _phase_label(phase, number):
+    if phase == WORK:
+        return f'Pomodoro #{number}'
+    return 'Long break' if phase == LONG_BREAK else 'Short break'
+
+
+def _parse_time_of_day(text, now):
+    """The next time it will be `text` (HH:MM) o'clock after `now`."""
+    try:
+        of_day = time.strptime(text, '%H:%M')
+    except ValueError:
+        print(f'"{text}" is not a time of day. Expected HH:MM.')
+        exit(1)
+    local = time.localtime(now)
+    moment = time.mktime((local.tm_year, local.tm_mon, local.tm_mday,
+                          of_day.tm_hour, of_day.tm_min, 0, 0, 0, -1))
+    if moment < now:
+        moment = time.mktime((local.tm_year, local.tm_mon, local.tm_mday + 1,
+                              of_day.tm_hour, of_day.tm_min, 0, 0, 0, -1))
+    return moment
+
+
+def _print_schedule(args, count=8):
     with get_configuration() as config:
-        editor_exe = config['config']['editor']['value']
-        pomodoro = int(config['config']['pomodoro']['value'])
-        short = int(config['config']['short']['value'])
-        long_ = int(config['config']['long']['value'])
-
-        # Backwards compatibility: if property sound does not
-        # exist, set it to the default value
-        if 'sound' not in config['config']:
-            config['config']['sound'] = \
-                    get_default_configuration()['config']['sound']
-        sound = config['config']['sound']['value']
-        play_sound = (sound and os.path.exists(sound))
-
-        if 'break-sound' not in config['config']:
-            config['config']['break-sound'] = \
-                    get_default_configuration()['config']['break-sound']
-        break_sound = config['config']['break-sound']['value']
-        play_break_sound = (break_sound and os.path.exists(break_sound))
+        settings = session_settings(config)
+    now = time.time()
+    status = read_status()
+    if status is None:
+        timeline = plan(settings, now)
+    else:
+        # Lay out the phases after the running one, from when it ends
+        phase, number, remaining, paused, position = status
+        timeline = plan(settings, now + remaining, position + 1, number)
+
+    def clock_time(moment):
+        return time.strftime('%H:%M', time.localtime(moment))
+
+    if args['--at'] is not None:
+        moment = _parse_time_of_day(args['--at'], now)
+        if moment < timeline.start(0):
+            label = _phase_label(phase_name(phase), number)
+            print(f'At {clock_time(moment)}: {label} (running now), until '
+                  f'{clock_time(timeline.start(0))}.')
+        else:
+            index = timeline.index_at(moment)
+            label = _phase_label(timeline.kind(index), timeline.number(index))
+            print(f'At {clock_time(moment)}: {label}, from '
+                  f'{clock_time(timeline.start(index))} to '
+                  f'{clock_time(timeline.end(index))}.')
+        return
+
+    if status is not None:
+        paused_mark = ' (paused)' if paused else ''
+        print(f'Now    {_phase_label(phase_name(phase), number)}, '
+              f'{human_time_interval(remaining)} left{paused_mark}')
+    for index in range(count):
+        print(f'{clock_time(timeline.start(index))}  '
+              f'{_phase_label(timeline.kind(index), timeline.number(index))}')
+    index = timeline.next_index(LONG_BREAK, timeline.start(0))
+    if index is not None:
+        print(f'Next long break at {clock_time(timeline.start(index))}.')
+
+
+def _parse_date(text):
+    try:
+        return time.mktime(time.strptime(text, '%Y-%m-%d'))
+    except ValueError:
+        print(f'"{text}" is not a date. Expected YYYY-MM-DD.')
+        exit(1)
 
-    if with_tasks:
-        # Check that editor is valid at runtime
-        if not (os.path.exists(editor_exe) and os.access(editor_exe, os.X_OK)):
-            editor_exe = os.environ['EDITOR']
-            if not editor_exe or \
-                    not (os.path.exists(editor_exe) and os.access(editor_exe, os.X_OK)):
-                editor_exe = '/bin/nano'
-                if not (os.path.exists(editor_exe)
-                        and os.access(editor_exe, os.X_OK)):
-                    print('Configured editor does not exist, $EDITOR is '
-                          'not set and could not fall back to /bin/nano.\n'
-                          'Please set your text editor using '
-                          '`pomo set editor <editor path>')
-                    exit(1)
-                else:
-                    print('Warning: configured editor does not exist and '
-                          '$EDITOR is not set. Falling back to /bin/nano.')
-                    with get_configuration() as config:
-                        config['config']['editor']['value'] = '/bin/nano'
+
+def _date_range(args):
+    since = until = None
+    if args['--since'] is not None:
+        since = _parse_date(args['--since'])
+    if args['--until'] is not None:
+        # Include the whole of the last day
+        until = _parse_date(args['--until']) + 24*60*60
+    return since, until
+
+
+def _day_start(timestamp, days=0):
+    """Midnight of the day `timestamp` falls on, moved by `days` days."""
+    local = time.localtime(timestamp)
+    return time.mktime((local.tm_year, local.tm_mon, local.tm_mday + days,
+                        0, 0, 0, 0, 0, -1))
+
+
+def _print_statistics(args):
+    from internal import rollup
+    if args['--rebuild']:
+        count = rollup.rebuild()
+        print(f'Rebuilt the statistics from {count} records.')
+        return
+    _sync(False)
+    now = time.time()
+    week_start = _day_start(now, -time.localtime(now).tm_wday)
+    if args['weeks']:
+        _print_weeks(week_start)
+        return
+    if args['tasks']:
+        _print_tasks()
+        return
+    if args['today']:
+        since, until = _day_start(now), None
+    elif args['week']:
+        since, until = week_start, None
+    else:
+        since, until = _date_range(args)
+    stats = rollup.totals(since, until)
+    phase_time = stats['time']
+    print(f'Pomodoros completed: {stats["completed"][WORK]}')
+    print(f'Worked:              {human_time_interval(phase_time[WORK])}')
+    print(f'Short breaks:        {human_time_interval(phase_time[SHORT_BREAK])}')
+    print(f'Long breaks:         {human_time_interval(phase_time[LONG_BREAK])}')
+    print(f'Paused:              {human_time_interval(phase_time[PAUSE])}')
+    print(f'Over planned time:   {human_time_interval(phase_time[OVERRUN])}')
+    print(f'Days worked:         {stats["days"]}')
+
+
+def _print_weeks(week_start, count=12):
+    # Weeks start on a Monday; mktime normalizes the day of the month
+    starts = [_day_start(week_start, -7*weeks_ago)
+              for weeks_ago in reversed(range(count))]
+    from internal import rollup
+    weeks = rollup.weeks(starts[0])
+    print('Week      Pomodoros  Worked         Days')
+    for start in starts:
+        week = rollup.week_key(start)
+        stats = weeks.get(week, rollup.empty_bucket())
+        print(f'{week}  {stats["completed"][WORK]:>9}  '
+              f'{human_time_interval(stats["time"][WORK]):<13}  '
+              f'{stats["days"]:>4}')
+
+
+def _print_tasks():
+    from internal import rollup
+    tasks = rollup.tasks()
+    if not tasks:
+        print('No tasks yet.')
+        return
+    for task, stats in sorted(tasks.items(),
+                              key=lambda item: -item[1]['time'][WORK]):
+        print(f'- {task}')
+        print(f'  {stats["completed"][WORK]} pomodoros, worked '
+              f'{human_time_interval(stats["time"][WORK])}')
+
+
+def _print_report(args):
+    from internal import report
+    writers = {'csv': report.write_csv, 'json': report.write_json}
+    if args['--format'] not in writers:
+        print(f'"{args["--format"]}" is not a report format. '
+              'Expected "csv" or "json".')
+        exit(1)
+    for directory in args['<directory>']:
+        if not os.path.isdir(directory):
+            print(f'"{directory}" is not a directory.')
+            exit(1)
+    since, until = _date_range(args)
+    merged = report.merged_records(args['<directory>'], since, until)
+    writers[args['--format']](report.weekly_rows(merged), sys.stdout)
+
+
+def _tasks_from_editor(editor_exe):
+    # Check that editor is valid at runtime
+    if not (os.path.exists(editor_exe) and os.access(editor_exe, os.X_OK)):
+        editor_exe = os.environ['EDITOR']
+        if not editor_exe or \
+                not (os.path.exists(editor_exe) and os.access(editor_exe, os.X_OK)):
+            editor_exe = '/bin/nano'
+            if not (os.path.exists(editor_exe)
+                    and os.access(editor_exe, os.X_OK)):
+                print('Configured editor does not exist, $EDITOR is '
+                      'not set and could not fall back to /bin/nano.\n'
+                      'Please set your text editor using '
+                      '`pomo set editor <editor path>')
+                exit(1)
             else:
-                print('Warning: configured editor does not exist. '
-                      f'Falling back to $EDITOR ("{os.environ["EDITOR"]}").')
+                print('Warning: configured editor does not exist and '
+                      '$EDITOR is not set. Falling back to /bin/nano.')
                 with get_configuration() as config:
-                    config['config']['editor']['value'] = os.environ['EDITOR']
-
-        # Get tasks
-        empty_text = ('# Write your tasks separated by a blank line.\n'
-                      '# Lines starting with a # will be ignored.\n'
-                      '# Once you\'re done, exit the editor.')
-        tasks_input = get_input_from_editor(empty_text, editor_exe)
-        tasks = map(lambda task: task.strip(), tasks_input.split('\n\n'))
-        tasks = filter(lambda task: task, tasks)
-        tasks = map(lambda task: ' '.join(
-            x.strip() for x in task.split('\n') if not x.startswith('#')),
-            tasks)
-        tasks = filter(lambda task: task, tasks)
-        tasks = list(tasks)
-        
+                    config['config']['editor']['value'] = '/bin/nano'
+        else:
+            print('Warning: configured editor does not exist. '
+                  f'Falling back to $EDITOR ("{os.environ["EDITOR"]}").')
+            with get_configuration() as config:
+                config['config']['editor']['value'] = os.environ['EDITOR']
+
+    # Get tasks
+    empty_text = ('# Write your tasks separated by a blank line.\n'
+                  '# Lines starting with a # will be ignored.\n'
+                  '# Once you\'re done, exit the editor.')
+    tasks_input = get_input_from_editor(empty_text, editor_exe)
+    tasks = map(lambda task: task.strip(), tasks_input.split('\n\n'))
+    tasks = filter(lambda task: task, tasks)
+    tasks = map(lambda task: ' '.join(
+        x.strip() for x in task.split('\n') if not x.startswith('#')),
+        tasks)
+    tasks = filter(lambda task: task, tasks)
+    return list(tasks)
+
+
+def _export(args):
+    from internal import export
+    writers = {'csv': export.write_csv, 'jsonl': export.write_jsonl}
+    if args['--format'] not in writers:
+        print(f'"{args["--format"]}" is not an export format. '
+              'Expected "csv" or "jsonl".', file=sys.stderr)
+        exit(1)
+    since, until = _date_range(args)
+    # The records go to stdout, so anything else goes to stderr
+    _sync(False, sys.stderr)
+    try:
+        writers[args['--format']](export.history_lines(since, until),
+                                  sys.stdout)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader stopped early (e.g. `head`); Python would complain
+        # again when flushing stdout at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
+def _run(with_tasks, simulate=None):
+    if simulate is None:
+        _sync(False)
+        keyboard = Keyboard()
+        session = Session(renderer=ProgressBar(), notifier=notify_and_print,
+                          controls=keyboard if keyboard.enabled else None)
+    else:
+        # A simulation runs on a virtual clock, and nothing leaves the
+        # process: no notifications, hooks, sounds or key presses
+        clock = VirtualClock()
+        def say(text):
+            print(f'[{human_time_interval(clock.monotonic())}] {text}')
+        keyboard = Keyboard(enabled=False)
+        session = Session(clock=clock, notifier=say, pomodoros=simulate,
+                          record=False, publish=False, run_hooks=False)
+
+    unicode = supports_unicode()
+    def print_change(property, old, new):
+        arrow = '→' if unicode else '->'
+        print(f'Configuration changed: "{property}": "{old}" {arrow} '
+              f'"{new}"')
+    session.on(SETTINGS_CHANGE, print_change)
+
+    tasks = []
+    if with_tasks:
+        with get_configuration() as config:
+            editor_exe = config['config']['editor']['value']
+        if editor_exe == BUILTIN:
+            tasks = get_tasks_from_terminal()
+        else:
+            tasks = _tasks_from_editor(editor_exe)
+
         # Abort
         if len(tasks) == 0:
             print('No tasks given, exiting')
             exit(0)
 
-        # User feedback
-        print('Ok, your tasks are:')
-        print('\n'.join(f'  [{i}]: {task}' for i, task in enumerate(tasks)))
+        # User feedback (the built-in prompt already showed them)
+        if editor_exe != BUILTIN:
+            print('Ok, your tasks are:')
+            print('\n'.join(f'  [{i}]: {task}'
+                            for i, task in enumerate(tasks)))
         print('')
+    session.tasks = tasks
 
     # Start pomodoro routine
-    start_time = time.time()
-    pomodoro_count = 0
-    try:
-        while True:
-            notify_and_print(f'Pomodoro #{pomodoro_count+1} starting!')
-            countdown_seconds(pomodoro)
-
-            try:
-                checkmarks = '✓'*((pomodoro_count % 4) + 1)
-                notify_and_print(f'{checkmarks} Done!')
-            except UnicodeEncodeError:
-                notify_and_print('Done!')
-
-            if play_sound:
-                threading.Thread(target=playsound, args=(sound,)).start()
-
-            if ((pomodoro_count+1) % 4) == 0:
-                try:
-                    notify_and_print('⏲️ Take a long break!')
-                except UnicodeEncodeError:
-                    notify_and_print('Take a long break!')
-                countdown_seconds(long_)
-            else:
-                try:
-                    notify_and_print('⏲️ Take a short break!')
-                except UnicodeEncodeError:
-                    notify_and_print('Take a short break!')
-                countdown_seconds(short)
-
-            if play_break_sound:
-                threading.Thread(target=playsound, args=(break_sound,)).start()
-
-            pomodoro_count += 1
-    except KeyboardInterrupt:
-        pass
+    if keyboard.enabled:
+        print(controls.HELP)
+    with keyboard:
+        ledger = session.run()
 
     # Give statistics
-    work_time = time.time() - start_time
+    totals = ledger.totals
     print('\n')
     print('Good work!')
     if with_tasks:
         print('Your tasks were:')
         print('\n'.join(f'  - {task}' for i, task in enumerate(tasks)))
-    print(f'You worked for {human_time_interval(work_time)}.')
-    print(f'You worked through {pomodoro_count} pomodoros.')
+    print(f'You worked for {human_time_interval(totals[WORK])}.')
+    print('You took short breaks for '
+          f'{human_time_interval(totals[SHORT_BREAK])} and long breaks for '
+          f'{human_time_interval(totals[LONG_BREAK])}.')
+    if totals[PAUSE] >= 1:
+        print(f'You paused for {human_time_interval(totals[PAUSE])}.')
+    if totals[OVERRUN] >= 1:
+        print(f'You went over the planned time by '
+              f'{human_time_interval(totals[OVERRUN])}.')
+    print(f'You worked through {ledger.completed[WORK]} pomodoros.')
     print('See you next time!')
+    problems = hooks.problems()
+    if problems:
+        print('Some hooks did not run as they should have:', file=sys.stderr)
+        print('\n'.join(f'  - {problem}' for problem in problems),
+              file=sys.stderr)
     exit(0)
 
 
-if __name__ == '__main__':
+def main():
     args = docopt(__doc__, version="pomo 0.9")
+    try:
+        _main(args)
+    except PomoError as error:
+        print(error)
+        exit(1)
 
+
+def _main(args):
     if args['--man']:
         _print_readme()
         exit(0)
@@ -276,6 +563,30 @@ if __name__ == '__main__':
         _list_properties()
         exit(0)
 
+    if args['feed']:
+        follow()
+        exit(0)
+
+    if args['stats']:
+        _print_statistics(args)
+        exit(0)
+
+    if args['schedule']:
+        _print_schedule(args)
+        exit(0)
+
+    if args['sync']:
+        _sync(True)
+        exit(0)
+
+    if args['export']:
+        _export(args)
+        exit(0)
+
+    if args['report']:
+        _print_report(args)
+        exit(0)
+
     if args['set']:
         _edit_mode(args)
         exit(0)
@@ -284,4 +595,16 @@ if __name__ == '__main__':
         _reset_mode(args)
         exit(0)
     
+    if args['--simulate'] is not None:
+        try:
+            simulate = int(args['--simulate'])
+        except ValueError:
+            print(f'"{args["--simulate"]}" is not a number of pomodoros.')
+            exit(1)
+        _run(False, simulate)
+
     _run(not args['timer'])
+
+
+if __name__ == '__main__':
+    main()